@@ -0,0 +1,45 @@
+"""Add embedding cache model
+
+Revision ID: 199a767e05fc
+Revises: c3fa8979c0d5
+Create Date: 2026-10-18 09:12:41.118230
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "199a767e05fc"
+down_revision: Union[str, None] = "c3fa8979c0d5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "embedding_cache_model",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("chunk_hash_id", sa.String),
+        sa.Column("model", sa.String),
+        sa.Column("dimension", sa.Integer),
+        sa.Column("embedding", sa.LargeBinary),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+        sa.UniqueConstraint("chunk_hash_id", "model"),
+    )
+    op.create_index(
+        "ix_embedding_cache_model_chunk_hash_id",
+        "embedding_cache_model",
+        ["chunk_hash_id"],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_embedding_cache_model_chunk_hash_id", table_name="embedding_cache_model"
+    )
+    op.drop_table("embedding_cache_model")
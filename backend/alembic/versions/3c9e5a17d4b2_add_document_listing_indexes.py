@@ -0,0 +1,35 @@
+"""Add indexes for grouped document listing
+
+Revision ID: 3c9e5a17d4b2
+Revises: b7f3d92c6e18
+Create Date: 2026-10-18 18:42:37.518204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9e5a17d4b2"
+down_revision: Union[str, None] = "b7f3d92c6e18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_document_model_document_key", "document_model", ["document_key"]
+    )
+    op.create_index(
+        "ix_conversation_document_document_id",
+        "conversation_document",
+        ["document_id"],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_conversation_document_document_id", table_name="conversation_document"
+    )
+    op.drop_index("ix_document_model_document_key", table_name="document_model")
@@ -0,0 +1,40 @@
+"""Add document key to ingestion jobs
+
+Revision ID: 4d8f2b6a9c13
+Revises: 7b1e9d3f5a28
+Create Date: 2026-10-19 09:12:05.731492
+
+"""
+
+import uuid
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "4d8f2b6a9c13"
+down_revision: Union[str, None] = "7b1e9d3f5a28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column("ingestion_job_model", sa.Column("document_key", sa.String))
+
+    # Jobs queued before the upgrade may still be resumed
+    connection = op.get_bind()
+    job_ids = connection.execute(
+        sa.text("SELECT id FROM ingestion_job_model WHERE document_key IS NULL")
+    ).fetchall()
+    if job_ids:
+        connection.execute(
+            sa.text(
+                "UPDATE ingestion_job_model SET document_key = :key WHERE id = :id"
+            ),
+            [{"key": str(uuid.uuid4()), "id": job_id} for (job_id,) in job_ids],
+        )
+
+
+def downgrade():
+    op.drop_column("ingestion_job_model", "document_key")
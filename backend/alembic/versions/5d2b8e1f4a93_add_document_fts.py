@@ -0,0 +1,68 @@
+"""Add full-text index over document content
+
+Revision ID: 5d2b8e1f4a93
+Revises: 199a767e05fc
+Create Date: 2026-10-18 14:02:17.530412
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5d2b8e1f4a93"
+down_revision: Union[str, None] = "199a767e05fc"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # External content FTS5 table, it stores only the index and reads the
+    # text itself from document_model
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE document_fts USING fts5(
+            title, content, content='document_model', content_rowid='id'
+        )
+        """
+    )
+
+    # Keep the index in sync with document_model
+    op.execute(
+        """
+        CREATE TRIGGER document_fts_insert AFTER INSERT ON document_model BEGIN
+            INSERT INTO document_fts(rowid, title, content)
+            VALUES (new.id, new.title, new.content);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER document_fts_delete AFTER DELETE ON document_model BEGIN
+            INSERT INTO document_fts(document_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER document_fts_update AFTER UPDATE OF title, content
+        ON document_model BEGIN
+            INSERT INTO document_fts(document_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO document_fts(rowid, title, content)
+            VALUES (new.id, new.title, new.content);
+        END
+        """
+    )
+
+    # Index existing documents
+    op.execute("INSERT INTO document_fts(document_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS document_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS document_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS document_fts_insert")
+    op.execute("DROP TABLE IF EXISTS document_fts")
@@ -0,0 +1,29 @@
+"""Track which messages are in their conversation's message index
+
+Revision ID: 7b1e9d3f5a28
+Revises: f2a7c4e91d06
+Create Date: 2026-10-18 22:31:40.518264
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "7b1e9d3f5a28"
+down_revision: Union[str, None] = "f2a7c4e91d06"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column(
+        "message_model",
+        sa.Column("is_indexed", sa.Boolean, server_default=sa.false()),
+    )
+
+
+def downgrade():
+    op.drop_column("message_model", "is_indexed")
@@ -0,0 +1,46 @@
+"""Add ingestion job model
+
+Revision ID: 8e4c1a7b2f60
+Revises: 5d2b8e1f4a93
+Create Date: 2026-10-18 15:21:44.903126
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "8e4c1a7b2f60"
+down_revision: Union[str, None] = "5d2b8e1f4a93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "ingestion_job_model",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column(
+            "conversation_id", sa.Integer, sa.ForeignKey("conversation_model.id")
+        ),
+        sa.Column("source_type", sa.String),
+        sa.Column("source", sa.String),
+        sa.Column("content_type", sa.String, nullable=True),
+        sa.Column("file_path", sa.String, nullable=True),
+        sa.Column("status", sa.String, default="pending"),
+        sa.Column("pages_parsed", sa.Integer, default=0),
+        sa.Column("chunks_embedded", sa.Integer, default=0),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_ingestion_job_model_status", "ingestion_job_model", ["status"])
+
+
+def downgrade():
+    op.drop_index("ix_ingestion_job_model_status", table_name="ingestion_job_model")
+    op.drop_table("ingestion_job_model")
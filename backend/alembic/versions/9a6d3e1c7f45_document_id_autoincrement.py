@@ -0,0 +1,65 @@
+"""Never reuse document ids
+
+Revision ID: 9a6d3e1c7f45
+Revises: 4d8f2b6a9c13
+Create Date: 2026-10-19 10:31:48.206137
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a6d3e1c7f45"
+down_revision: Union[str, None] = "4d8f2b6a9c13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER document_fts_insert AFTER INSERT ON document_model BEGIN
+        INSERT INTO document_fts(rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER document_fts_delete AFTER DELETE ON document_model BEGIN
+        INSERT INTO document_fts(document_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER document_fts_update AFTER UPDATE OF title, content
+    ON document_model BEGIN
+        INSERT INTO document_fts(document_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO document_fts(rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+
+def _rebuild_document_model(autoincrement: bool):
+    # SQLite can only change AUTOINCREMENT by recreating the table, which drops
+    # its triggers, so the full-text index triggers are recreated after it
+    with op.batch_alter_table(
+        "document_model",
+        recreate="always",
+        table_kwargs={"sqlite_autoincrement": autoincrement},
+    ):
+        pass
+
+    for trigger in FTS_TRIGGERS:
+        op.execute(trigger)
+
+
+def upgrade():
+    # Vector index tombstones are keyed by document id, a reused id would be
+    # hidden by the tombstone of the deleted document
+    _rebuild_document_model(autoincrement=True)
+
+
+def downgrade():
+    _rebuild_document_model(autoincrement=False)
@@ -0,0 +1,77 @@
+"""Add token counts to messages
+
+Revision ID: a41d6e0c9b57
+Revises: 3c9e5a17d4b2
+Create Date: 2026-10-18 20:14:51.903126
+
+"""
+
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a41d6e0c9b57"
+down_revision: Union[str, None] = "3c9e5a17d4b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TOKENIZER = "cl100k_base"
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    op.add_column("message_model", sa.Column("token_count", sa.Integer))
+    op.add_column("message_model", sa.Column("tokenizer", sa.String))
+
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(TOKENIZER)
+    except Exception as e:
+        # Messages without a count are counted when they're next used instead
+        print(f"Skipping token count backfill, tokenizer unavailable: {e}")
+        return
+
+    connection = op.get_bind()
+    last_id = 0
+
+    while True:
+        rows = connection.execute(
+            sa.text(
+                "SELECT id, content FROM message_model WHERE id > :last_id "
+                "ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+
+        counts = []
+        for id, content in rows:
+            if isinstance(content, str):
+                try:
+                    content = json.loads(content)
+                except ValueError:
+                    content = None
+            text = content.get("text") if isinstance(content, dict) else None
+            token_count = (
+                len(encoding.encode(text, disallowed_special=())) if text else 0
+            )
+            counts.append({"id": id, "count": token_count, "tokenizer": TOKENIZER})
+
+        connection.execute(
+            sa.text(
+                "UPDATE message_model SET token_count = :count, tokenizer = :tokenizer "
+                "WHERE id = :id"
+            ),
+            counts,
+        )
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    op.drop_column("message_model", "tokenizer")
+    op.drop_column("message_model", "token_count")
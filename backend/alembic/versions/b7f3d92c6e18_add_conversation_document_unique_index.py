@@ -0,0 +1,38 @@
+"""Add unique index on conversation_document
+
+Revision ID: b7f3d92c6e18
+Revises: 8e4c1a7b2f60
+Create Date: 2026-10-18 16:05:12.271845
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7f3d92c6e18"
+down_revision: Union[str, None] = "8e4c1a7b2f60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Drop duplicate links so the unique index can be created
+    op.execute("""
+        DELETE FROM conversation_document
+        WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM conversation_document
+            GROUP BY conversation_id, document_id
+        )
+        """)
+    op.create_index(
+        "ix_conversation_document_unique",
+        "conversation_document",
+        ["conversation_id", "document_id"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_conversation_document_unique", table_name="conversation_document")
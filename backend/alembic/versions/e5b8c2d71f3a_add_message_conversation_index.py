@@ -0,0 +1,29 @@
+"""Add index on message conversation and id
+
+Revision ID: e5b8c2d71f3a
+Revises: a41d6e0c9b57
+Create Date: 2026-10-18 21:03:27.662410
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b8c2d71f3a"
+down_revision: Union[str, None] = "a41d6e0c9b57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_message_model_conversation_id_id",
+        "message_model",
+        ["conversation_id", "id"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_message_model_conversation_id_id", table_name="message_model")
@@ -0,0 +1,30 @@
+"""Add rolling summary to conversations
+
+Revision ID: f2a7c4e91d06
+Revises: e5b8c2d71f3a
+Create Date: 2026-10-18 21:48:12.305817
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a7c4e91d06"
+down_revision: Union[str, None] = "e5b8c2d71f3a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column("conversation_model", sa.Column("summary", sa.Text))
+    op.add_column("conversation_model", sa.Column("summary_message_id", sa.Integer))
+    op.add_column("conversation_model", sa.Column("summary_token_count", sa.Integer))
+
+
+def downgrade():
+    op.drop_column("conversation_model", "summary_token_count")
+    op.drop_column("conversation_model", "summary_message_id")
+    op.drop_column("conversation_model", "summary")
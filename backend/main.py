@@ -1,5 +1,6 @@
 import uvicorn
 import os
+import asyncio
 import sys
 from pathlib import Path
 from contextlib import asynccontextmanager
@@ -15,12 +16,25 @@ from routes import routes
 from core.setup import run_setup
 from auth.middleware import AuthMiddleware
 from database import SQLALCHEMY_DATABASE_URL
+from modules.documents.services.document_service import sync_document_index
+from modules.documents.services.ingestion_service import ingestion_queue
+from modules.documents.utils import shutdown_parse_pool
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     run_setup(SQLALCHEMY_DATABASE_URL)
+
+    # Load the shared document index, and re-embed stored chunks missing from
+    # it, e.g. after a model change
+    sync_task = asyncio.create_task(sync_document_index())
+
+    # Process queued document uploads, resuming any interrupted by a restart
+    await ingestion_queue.start()
     yield
+    await ingestion_queue.stop()
+    sync_task.cancel()
+    shutdown_parse_pool()
 
 
 app = FastAPI(lifespan=lifespan)
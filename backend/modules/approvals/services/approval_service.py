@@ -8,6 +8,7 @@ from modules.messages.schemas import (
     StatusMessage,
     Content,
 )
+from modules.conversations.services.recall_service import RecallService
 from modules.plugins.models import FunctionInstanceModel
 from modules.messages.models import MessageModel
 from modules.messages.services.message_service import MessageService
@@ -146,6 +147,7 @@ class ApprovalService:
         )
 
         if message:
+            RecallService(self.db).remove_messages([message])
             MessageService(self.db).delete_message(message)
 
         return f"Request {approval_request.status}"
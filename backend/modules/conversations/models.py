@@ -2,11 +2,13 @@ from sqlalchemy import (
     Column,
     Integer,
     String,
+    Text,
     ForeignKey,
     Boolean,
     DateTime,
     JSON,
     Table,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -18,6 +20,10 @@ conversation_document = Table(
     Base.metadata,
     Column("conversation_id", Integer, ForeignKey("conversation_model.id")),
     Column("document_id", Integer, ForeignKey("document_model.id")),
+    Index(
+        "ix_conversation_document_unique", "conversation_id", "document_id", unique=True
+    ),
+    Index("ix_conversation_document_document_id", "document_id"),
 )
 
 
@@ -36,6 +42,10 @@ class ConversationModel(Base):
     settings = Column(JSON, nullable=True)
     data = Column(JSON, nullable=True)
     is_archived = Column(Boolean, default=False)
+    # Rolling summary of the history up to and including `summary_message_id`
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+    summary_token_count = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -12,6 +12,8 @@ from modules.messages.services.message_service import MessageService
 from modules.approvals.services.approval_service import ApprovalService
 from modules.presets.services.preset_service import PresetService
 from .services.conversation_service import ConversationService
+from .services.summary_service import SummaryService
+from .services.recall_service import RecallService
 
 router = APIRouter()
 
@@ -79,6 +81,8 @@ def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
     if not is_deleted:
         raise HTTPException(status_code=400, detail="Conversation could not be deleted")
 
+    RecallService(db).delete_index(conversation_id)
+
     return {"detail": "Conversation deleted successfully"}
 
 
@@ -185,6 +189,8 @@ async def archive_conversation_messages(
     if conversation:
         for message in conversation.messages:
             MessageService(db).archive_message(message)
+        SummaryService(db).clear_summary(conversation)
+        RecallService(db).delete_index(conversation.id)
         return JSONResponse(content={"status": "success"})
     else:
         raise HTTPException(status_code=404, detail="Conversation not found")
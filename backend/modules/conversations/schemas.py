@@ -24,6 +24,7 @@ class Conversation(ConversationBase):
     excerpt: Optional[str] = None
     plugins: Optional[List[PluginInstance]] = []
     settings: Optional[Dict] = None
+    summary: Optional[str] = None
     data: Optional[Dict] = None
 
 
@@ -1,7 +1,6 @@
 import json
 from typing import TYPE_CHECKING
 
-import tiktoken
 from sqlalchemy.orm import Session
 
 from modules.conversations.models import ConversationModel
@@ -9,7 +8,10 @@ from modules.messages.schemas import UserMessage, FunctionMessage, AssistantMess
 from modules.plugins.services.plugin_service import PluginService
 from modules.messages.services.message_chain import MessageChain
 from modules.messages.services.message_service import MessageService
+from modules.messages.services.token_counter import count_tokens
 from .conversation_service import ConversationService
+from .summary_service import SummaryService, schedule_summary
+from .recall_service import RecallService, schedule_indexing
 
 if TYPE_CHECKING:
     from core.services.message_handler import MessageHandler
@@ -60,6 +62,10 @@ class ChatService:
                 conversation, context, functions
             )
 
+            # Embed the new messages for recall in later turns
+            if RecallService(self.db).is_enabled(conversation):
+                schedule_indexing(conversation.id)
+
             follow_up_requested = False
 
             if ai_response:
@@ -92,33 +98,55 @@ class ChatService:
         await PluginService(self.db).add_snippets_to_context(context, conversation)
 
         # Fill remaining tokens with conversation context
-        self.add_conversation_to_context(context, conversation)
+        await self.add_conversation_to_context(context, conversation)
 
         return context
 
-    def add_conversation_to_context(
+    async def add_conversation_to_context(
         self, context: "MessageChain", conversation: ConversationModel
     ):
-        # Generate remaining context from past messages
-        sorted_messages = ConversationService(self.db).get_conversation_messages(
+        # Past messages newest first, only loaded until the token budget is spent
+        sorted_messages = ConversationService(self.db).iter_conversation_messages(
             conversation
         )
 
-        tokenizer = tiktoken.encoding_for_model("gpt-4")
-
         token_count = 0
 
+        # Only the messages of this turn are counted, history has stored counts
         for message in context.get_chain():
-            tokens = len(list(tokenizer.encode(message.content.text)))
-            message.tokens = tokens
-            token_count += tokens
-
-        # Insert context messages before we append the user's message
-        insert_index = len(context.get_precompiled_chain())
+            message.tokens = count_tokens(message.content.text)
+            token_count += message.tokens
 
         max_input_tokens = conversation.settings["max_input_tokens"]
 
+        summary_service = SummaryService(self.db)
+        summarize = summary_service.is_enabled(conversation)
+        turn_tokens = token_count
+
+        # Summarized history is sent as its summary instead
+        summarized_until = None
+        if summarize and conversation.summary_message_id is not None:
+            summarized_until = conversation.summary_message_id
+            if conversation.summary:
+                context.add_snippet(
+                    summary_service.format_summary(conversation.summary),
+                    tokens=conversation.summary_token_count,
+                )
+                token_count += conversation.summary_token_count
+
+        # With recall, only the latest messages are sent in full, plus the
+        # older turns most relevant to this one
+        recall_service = RecallService(self.db)
+        recall = recall_service.is_enabled(conversation)
+        recent_messages = []
+
         for message in sorted_messages:
+            if summarized_until is not None and message.id <= summarized_until:
+                break
+
+            if recall and len(recent_messages) >= recall_service.recent_messages:
+                break
+
             if (
                 not message.content
                 and not message.function_call
@@ -126,48 +154,133 @@ class ChatService:
             ):
                 continue
 
-            new_message_tokens = len(list(tokenizer.encode(message.content.text)))
+            new_message_tokens = message.tokens
+            if new_message_tokens is None:
+                # Saved before token counts were stored, or by another tokenizer
+                new_message_tokens = count_tokens(message.content.text)
 
             if token_count + new_message_tokens > max_input_tokens:
+                if summarize:
+                    # Keep half the room left for history unsummarized, so
+                    # the summary is only updated every few turns
+                    keep_tokens = (
+                        max_input_tokens - turn_tokens - summary_service.max_tokens
+                    ) // 2
+                    if keep_tokens > 0:
+                        schedule_summary(conversation.id, keep_tokens)
                 break
 
-            if message.role == "user":
-                context.add_user_message(
-                    message.content,
-                    id=message.id,
-                    tokens=new_message_tokens,
-                    index=insert_index,
-                )
-            elif message.role == "assistant":
-                context.add_ai_message(
-                    message.content,
-                    function_call=message.function_call,
-                    id=message.id,
-                    tokens=new_message_tokens,
-                    index=insert_index,
-                )
-            elif message.role == "function":
-                context.add_function_message(
-                    message.content,
-                    function_call=message.function_call,
-                    id=message.id,
-                    tokens=new_message_tokens,
-                    index=insert_index,
-                )
-            elif message.role == "system":
-                context.add_system_message(
-                    message.content,
-                    id=message.id,
-                    tokens=new_message_tokens,
-                    index=1,
-                )
-            else:
+            if not self.add_history_message(context, message, new_message_tokens):
                 continue
 
             token_count += new_message_tokens
+            recent_messages.append(message)
+
+        if recall and recent_messages:
+            token_count = await self.add_recalled_turns(
+                context, conversation, recent_messages, token_count, max_input_tokens
+            )
 
         print(f"Final request: {token_count} tokens.")
 
+    async def add_recalled_turns(
+        self,
+        context: "MessageChain",
+        conversation: ConversationModel,
+        recent_messages: list,
+        token_count: int,
+        max_input_tokens: int,
+    ):
+        """
+        Add the older turns most relevant to this turn's user message, before
+        the recent messages, as far as the token budget allows
+        """
+        user_message = context.get_user_message()
+        text = user_message.text if user_message else None
+        if not text:
+            # A tool follow-up, recall what the last user message was about
+            text = next(
+                (
+                    message.content.text
+                    for message in recent_messages
+                    if message.role == "user"
+                ),
+                None,
+            )
+
+        try:
+            turns = await RecallService(self.db).find_relevant_turns(
+                conversation, text, before_id=recent_messages[-1].id
+            )
+        except Exception as e:
+            print(f"Couldn't recall older messages: {e}")
+            return token_count
+
+        conversation_service = ConversationService(self.db)
+        recalled_messages = []
+        for turn in turns:
+            turn = [conversation_service.to_message(message) for message in turn]
+            for message in turn:
+                if message.tokens is None:
+                    message.tokens = count_tokens(message.content.text)
+
+            turn_tokens = sum(message.tokens for message in turn)
+            if token_count + turn_tokens > max_input_tokens:
+                continue
+
+            recalled_messages += turn
+            token_count += turn_tokens
+
+        # History is added newest first
+        recalled_messages.sort(key=lambda message: message.id, reverse=True)
+        for message in recalled_messages:
+            self.add_history_message(context, message, message.tokens)
+
+        if recalled_messages:
+            print(f"Recalled {len(recalled_messages)} older messages.")
+
+        return token_count
+
+    def add_history_message(self, context: "MessageChain", message, tokens: int):
+        """
+        Add a past message before the history already in the context, returns
+        False for messages that aren't sent to the LLM
+        """
+        if message.role == "user":
+            context.add_user_message(
+                message.content,
+                id=message.id,
+                tokens=tokens,
+                history=True,
+            )
+        elif message.role == "assistant":
+            context.add_ai_message(
+                message.content,
+                function_call=message.function_call,
+                id=message.id,
+                tokens=tokens,
+                history=True,
+            )
+        elif message.role == "function":
+            context.add_function_message(
+                message.content,
+                function_call=message.function_call,
+                id=message.id,
+                tokens=tokens,
+                history=True,
+            )
+        elif message.role == "system":
+            context.add_system_message(
+                message.content,
+                id=message.id,
+                tokens=tokens,
+                index=1,
+            )
+        else:
+            return False
+
+        return True
+
     async def handle_tool_request(
         self, ai_response: AssistantMessage, conversation: ConversationModel
     ):
@@ -1,5 +1,5 @@
 import json
-from typing import List
+from typing import Iterator, List
 
 from sqlalchemy.orm import Session
 
@@ -8,6 +8,7 @@ from modules.presets.services.preset_service import PresetService
 from modules.plugins.services.plugin_service import PluginService
 from modules.spaces.services.space_service import SpaceService
 from modules.messages.services.message_service import MessageService
+from modules.messages.services.token_counter import TOKENIZER
 from ..models import ConversationModel
 
 
@@ -129,11 +130,37 @@ class ConversationService:
             conversation.id, archived=archived
         )
 
-        messages = [
-            MessageBase.model_validate(db_message) for db_message in db_messages
-        ]
+        return [self.to_message(db_message) for db_message in db_messages]
+
+    def iter_conversation_messages(
+        self, conversation: ConversationModel, page_size: int = 25
+    ) -> Iterator[MessageBase]:
+        """
+        Yield non-archived messages newest first, loaded a page at a time, so a
+        caller that stops early only pays for the messages it used
+        """
+        message_service = MessageService(self.db)
+        before_id = None
+
+        while True:
+            db_messages = message_service.get_messages_page(
+                conversation.id, before_id=before_id, limit=page_size
+            )
+            for db_message in db_messages:
+                yield self.to_message(db_message)
+
+            if len(db_messages) < page_size:
+                return
+
+            before_id = db_messages[-1].id
+            # Few round trips for long windows, little waste for short ones
+            page_size = min(page_size * 2, 400)
 
-        return messages
+    def to_message(self, db_message) -> MessageBase:
+        message = MessageBase.model_validate(db_message)
+        if db_message.tokenizer == TOKENIZER:
+            message.tokens = db_message.token_count
+        return message
 
     def delete_conversation(self, conversation_id: int):
         conversation = (
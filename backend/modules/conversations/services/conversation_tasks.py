@@ -0,0 +1,31 @@
+import asyncio
+
+
+class ConversationTasks:
+    """
+    Background tasks keyed by conversation, at most one running per conversation
+    """
+
+    def __init__(self):
+        self.tasks = {}
+
+    def schedule(self, conversation_id: int, coroutine_function, *args):
+        """
+        Run `coroutine_function(conversation_id, *args)` in the background,
+        unless it's already running for the conversation
+        """
+        task = self.tasks.get(conversation_id)
+        if task and not task.done():
+            return
+
+        task = asyncio.create_task(coroutine_function(conversation_id, *args))
+        self.tasks[conversation_id] = task
+
+        def forget(done):
+            if self.tasks.get(conversation_id) is done:
+                del self.tasks[conversation_id]
+
+        task.add_done_callback(forget)
+
+    async def wait(self):
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
@@ -1,6 +1,7 @@
 import json
 from typing import TYPE_CHECKING, Union
-from openai import AsyncOpenAI, OpenAI, AsyncAzureOpenAI
+
+from openai import AsyncOpenAI, AsyncAzureOpenAI
 
 from ..models import *
 from ..schemas import *
@@ -174,12 +175,3 @@ class LLMConnector:
         )
         print("Failed after 3 retries.")
         return None
-
-
-def get_embeddings(doc: str):
-    api_key = settings.chat_models.get("openai_api_key", None)
-    client = OpenAI(api_key=api_key)
-    response = client.embeddings.create(input=doc, model="text-embedding-ada-002")
-    serialized = response.model_dump()
-    embeddings = serialized["data"][0]["embedding"]
-    return embeddings
@@ -0,0 +1,217 @@
+import os
+import asyncio
+import hashlib
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from modules.documents.services.embedding_cache import EmbeddingCache
+from modules.documents.services.search_cache import TTLCache
+from modules.documents.services.vector_store import (
+    VectorIndex,
+    create_vector_index,
+    data_path,
+    delete_vector_index,
+)
+from modules.messages.models import MessageModel
+from modules.messages.services.message_service import MessageService
+from ..models import ConversationModel
+from .conversation_tasks import ConversationTasks
+
+# Only the start of longer messages, e.g. pasted files, is embedded
+MAX_EMBEDDED_CHARS = 8000
+
+index_tasks = ConversationTasks()
+
+# Loaded message indexes of recently active conversations, the rest are read
+# from disk again when needed
+message_indexes = TTLCache(
+    max_size=settings.get("conversations", {}).get("recall_cached_indexes", 32),
+    ttl=3600,
+)
+
+
+class RecallService:
+    """
+    Finds the older turns of a conversation most relevant to a new message, by
+    embedding search over the conversation's own message index. Embeddings are
+    shared with document search through the embedding cache.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+        conversation_settings = settings.get("conversations", {})
+        self.context_policy = conversation_settings.get("context_policy", "recent")
+        self.recent_messages = conversation_settings.get("recall_recent_messages", 10)
+        self.results = conversation_settings.get("recall_results", 4)
+
+    def is_enabled(self, conversation: ConversationModel) -> bool:
+        # Conversation settings override the global default
+        context_policy = (conversation.settings or {}).get(
+            "context_policy", self.context_policy
+        )
+        return context_policy == "recall"
+
+    def get_index(self, conversation_id: int) -> VectorIndex:
+        index = message_indexes.get(conversation_id)
+        if index is None:
+            # Conversations are small enough for exact search over a flat index
+            index = create_vector_index(_index_name(conversation_id), index_settings={})
+            message_indexes.put(conversation_id, index)
+
+        if index.model_changed:
+            index.reset()
+            MessageService(self.db).clear_indexed(conversation_id)
+        return index
+
+    def remove_messages(self, messages: List[MessageModel]):
+        """
+        Drop deleted messages from their conversation's index
+        """
+        for message in messages:
+            if (
+                message.is_indexed
+                and message.role in ["user", "assistant"]
+                and _index_exists(message.conversation_id)
+            ):
+                index = self.get_index(message.conversation_id)
+                index.remove(np.array([message.id], dtype=np.int64))
+
+    def delete_index(self, conversation_id: int):
+        """
+        Delete the conversation's index, e.g. when the conversation is deleted
+        or its history is cleared
+        """
+        message_indexes.pop(conversation_id)
+        delete_vector_index(_index_name(conversation_id))
+
+    def _embedding_text(self, text: Optional[str]):
+        text = (text or "").strip()[:MAX_EMBEDDED_CHARS]
+        return hashlib.sha256(text.encode()).hexdigest(), text
+
+    async def index_messages(self, conversation_id: int):
+        """
+        Embed and index the conversation's messages that aren't indexed yet.
+        Only user & assistant text is embedded, tool output isn't recalled.
+        """
+        index = self.get_index(conversation_id)
+        message_service = MessageService(self.db)
+        indexed_count = 0
+
+        while messages := message_service.get_unindexed_messages(conversation_id):
+            texts = {}
+            hashes = {}
+            for message in messages:
+                text = (message.content or {}).get("text")
+                if message.role in ["user", "assistant"] and text:
+                    text_hash, text = self._embedding_text(text)
+                    texts[text_hash] = text
+                    hashes[message.id] = text_hash
+
+            if hashes:
+                embeddings = await EmbeddingCache(self.db).get_embeddings(texts)
+                ids = np.array(list(hashes), dtype=np.int64)
+                vectors = np.array(
+                    [embeddings[text_hash] for text_hash in hashes.values()],
+                    dtype=np.float32,
+                )
+                await asyncio.to_thread(index.add, vectors, ids)
+
+            message_service.set_indexed([message.id for message in messages])
+            indexed_count += len(hashes)
+
+        return indexed_count
+
+    async def find_relevant_turns(
+        self, conversation: ConversationModel, text: str, before_id: int
+    ) -> List[List[MessageModel]]:
+        """
+        Up to `results` turns older than `before_id` most relevant to `text`,
+        most relevant first. A turn is a user message and the reply to it.
+        """
+        if not text or not self.results:
+            return []
+
+        index = self.get_index(conversation.id)
+        message_service = MessageService(self.db)
+        if not index.ntotal:
+            return []
+
+        text_hash, text = self._embedding_text(text)
+        embeddings = await EmbeddingCache(self.db).get_embeddings({text_hash: text})
+        self.db.commit()
+        search_vector = np.array([embeddings[text_hash]], dtype=np.float32)
+
+        # Both messages of a turn may match, so fetch enough for every turn.
+        # The index only holds this conversation's messages, and ids grow with
+        # time, so older messages are the ones below `before_id`.
+        distances, message_ids = await asyncio.to_thread(
+            index.search, search_vector, self.results * 2, None, before_id
+        )
+        hit_ids = [int(message_id) for message_id in message_ids[0] if message_id >= 0]
+        messages = {
+            message.id: message
+            for message in message_service.get_messages_by_ids(hit_ids)
+        }
+
+        turns = []
+        seen_ids = set()
+        for message_id in hit_ids:
+            message = messages.get(message_id)
+            if message is None or message_id in seen_ids:
+                continue
+
+            turn = [message]
+            partner = message_service.get_adjacent_message(
+                message, newer=message.role == "user"
+            )
+            if (
+                partner
+                and partner.id < before_id
+                and partner.role in ["user", "assistant"]
+                and partner.role != message.role
+                and (partner.content or {}).get("text")
+            ):
+                turn.append(partner)
+
+            turn.sort(key=lambda turn_message: turn_message.id)
+            seen_ids.update(turn_message.id for turn_message in turn)
+            turns.append(turn)
+
+            if len(turns) == self.results:
+                break
+
+        return turns
+
+
+def _index_name(conversation_id: int) -> str:
+    return f"messages/{conversation_id}"
+
+
+def _index_exists(conversation_id: int) -> bool:
+    return message_indexes.get(conversation_id) is not None or os.path.exists(
+        os.path.join(data_path, _index_name(conversation_id))
+    )
+
+
+async def index_conversation_messages(conversation_id: int):
+    db = SessionLocal()
+    try:
+        indexed_count = await RecallService(db).index_messages(conversation_id)
+        if indexed_count:
+            print(f"Indexed {indexed_count} messages of conversation {conversation_id}")
+    except Exception as e:
+        print(f"Couldn't index messages of conversation {conversation_id}: {e}")
+    finally:
+        db.close()
+
+
+def schedule_indexing(conversation_id: int):
+    """
+    Embed the conversation's new messages in the background
+    """
+    index_tasks.schedule(conversation_id, index_conversation_messages)
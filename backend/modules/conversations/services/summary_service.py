@@ -0,0 +1,211 @@
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from modules.llms.services.llm_service import LLMFactory
+from modules.messages.schemas import UserMessage
+from modules.messages.services.message_chain import MessageChain
+from modules.messages.services.message_service import MessageService
+from modules.messages.services.token_counter import count_tokens, get_encoding
+from ..models import ConversationModel
+from .conversation_service import ConversationService
+from .conversation_tasks import ConversationTasks
+
+SUMMARY_PROMPT = """Summarize the conversation below for an assistant that will \
+continue it without seeing these messages. Keep facts, decisions, names, numbers, \
+open questions and the user's goals and preferences, leave out small talk. Write \
+at most {max_words} words and reply with the summary only.
+{summary}
+Messages:
+
+{messages}"""
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n\n"
+
+summary_tasks = ConversationTasks()
+
+
+class SummaryService:
+    """
+    Folds history that no longer fits a conversation's `max_input_tokens` into
+    a rolling summary, which is sent in place of those messages
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+        conversation_settings = settings.get("conversations", {})
+        self.enabled = conversation_settings.get("summarize_history", False)
+        self.max_tokens = conversation_settings.get("summary_max_tokens", 500)
+        self.chunk_tokens = conversation_settings.get("summary_chunk_tokens", 3000)
+
+    def is_enabled(self, conversation: ConversationModel) -> bool:
+        # Conversation settings override the global default
+        return bool(
+            (conversation.settings or {}).get("summarize_history", self.enabled)
+        )
+
+    def format_summary(self, summary: str) -> str:
+        return SUMMARY_HEADER + summary
+
+    def clear_summary(self, conversation: ConversationModel):
+        conversation.summary = None
+        conversation.summary_message_id = None
+        conversation.summary_token_count = None
+        self.db.commit()
+
+    def find_cutoff(
+        self, conversation: ConversationModel, keep_tokens: int
+    ) -> Optional[int]:
+        """
+        Id of the newest message to summarize, so the messages after it fit in
+        `keep_tokens`. None if every unsummarized message fits.
+        """
+        kept_tokens = 0
+
+        for message in ConversationService(self.db).iter_conversation_messages(
+            conversation
+        ):
+            if (
+                conversation.summary_message_id is not None
+                and message.id <= conversation.summary_message_id
+            ):
+                return None
+
+            if message.tokens is None:
+                message.tokens = count_tokens(message.content.text)
+
+            kept_tokens += message.tokens
+            if kept_tokens > keep_tokens:
+                return message.id
+
+        return None
+
+    async def summarize(self, conversation: ConversationModel, until_id: int):
+        """
+        Fold the unsummarized messages up to and including `until_id` into the
+        summary, at most `chunk_tokens` of them per request
+        """
+        llm_settings = {
+            **conversation.settings["llm"],
+            "max_tokens": self.max_tokens,
+            "temperature": 0,
+        }
+        llm = LLMFactory.create_llm(llm_settings, message_handler=None)
+        message_service = MessageService(self.db)
+
+        while True:
+            after_id = conversation.summary_message_id
+            messages = message_service.get_messages_between(
+                conversation.id, after_id, until_id
+            )
+            if not messages:
+                return
+
+            lines = []
+            last_id = after_id
+            chunk_tokens = 0
+
+            for message in messages:
+                line = self._format_message(message)
+                tokens = count_tokens(line)
+
+                if lines and chunk_tokens + tokens > self.chunk_tokens:
+                    break
+
+                if tokens > self.chunk_tokens:
+                    # A single huge message, e.g. a pasted file, is cut short
+                    encoding = get_encoding()
+                    line = encoding.decode(
+                        encoding.encode(line, disallowed_special=())[
+                            : self.chunk_tokens
+                        ]
+                    )
+                    tokens = self.chunk_tokens
+
+                if line:
+                    lines.append(line)
+                chunk_tokens += tokens
+                last_id = message.id
+
+            summary = conversation.summary
+            if lines:
+                # Providers return None on errors, the summary is retried
+                # the next time history overflows
+                summary = await llm.create_completion(
+                    self._summary_context(conversation.summary, lines)
+                )
+                if not summary:
+                    print(f"Couldn't summarize conversation {conversation.id}")
+                    return
+                summary = summary.strip()
+
+            # History may have been cleared or summarized elsewhere meanwhile
+            self.db.refresh(conversation)
+            last_message = message_service.get_message_by_id(last_id)
+            if (
+                conversation.summary_message_id != after_id
+                or last_message is None
+                or last_message.is_archived
+            ):
+                return
+
+            conversation.summary = summary
+            conversation.summary_message_id = last_id
+            conversation.summary_token_count = (
+                count_tokens(self.format_summary(summary)) if summary else 0
+            )
+            self.db.commit()
+
+            print(
+                f"Summarized conversation {conversation.id} up to message {last_id}, "
+                f"{conversation.summary_token_count} tokens."
+            )
+
+    def _format_message(self, message) -> str:
+        text = (message.content or {}).get("text")
+        function_call = message.function_call or {}
+
+        if message.role == "user" and text:
+            return f"USER: {text}"
+        elif message.role == "assistant" and text:
+            return f"ASSISTANT: {text}"
+        elif message.role == "assistant" and function_call:
+            return f"ASSISTANT: (called {function_call.get('name')})"
+        elif message.role == "function" and text:
+            return f"{function_call.get('name', 'TOOL')} OUTPUT: {text}"
+        return ""
+
+    def _summary_context(self, summary: Optional[str], lines: List[str]):
+        # All in the user message, not every provider sends system messages
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.max_tokens * 3 // 4,
+            summary=f"\nSummary so far:\n\n{summary}\n" if summary else "",
+            messages="\n\n".join(lines),
+        )
+        return MessageChain(user_message=UserMessage(content={"text": prompt}))
+
+
+async def summarize_conversation(conversation_id: int, keep_tokens: int):
+    db = SessionLocal()
+    try:
+        conversation = ConversationService(db).get_conversation_by_id(conversation_id)
+        summary_service = SummaryService(db)
+
+        until_id = summary_service.find_cutoff(conversation, keep_tokens)
+        if until_id is not None:
+            await summary_service.summarize(conversation, until_id)
+    except Exception as e:
+        print(f"Couldn't summarize conversation {conversation_id}: {e}")
+    finally:
+        db.close()
+
+
+def schedule_summary(conversation_id: int, keep_tokens: int):
+    """
+    Summarize a conversation's older history in the background, so the most
+    recent `keep_tokens` of it stay unsummarized
+    """
+    summary_tasks.schedule(conversation_id, summarize_conversation, keep_tokens)
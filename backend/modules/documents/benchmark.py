@@ -0,0 +1,282 @@
+"""
+Retrieval benchmark over synthetic corpora, run from the backend directory:
+
+    python -m modules.documents.benchmark --sizes 10000 100000 1000000 --types Flat HNSW
+
+Each run ingests a generated corpus into a throwaway database and index through
+DocumentManager.save_documents, embedded locally by the deterministic hashing
+embedder, then times DocumentManager.similar_search end to end. Recall is
+measured against an exact search over the stored float embeddings.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import faiss
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from alembic.config import Config
+from alembic import command
+
+# Like main.py, some modules import `backend.*`
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+
+import routes  # Registers every model, relationships span modules
+from config import settings
+from modules.llms.services.embedding_service import (
+    HashEmbeddings,
+    set_embedding_provider,
+)
+from .models import DocumentModel, EmbeddingCacheModel
+from .services.document_service import DocumentManager
+from .services.vector_store import (
+    DEFAULT_INDEX_SETTINGS,
+    INDEX_FACTORY_STRINGS,
+    VectorIndex,
+)
+
+backend_path = Path(__file__).resolve().parents[2]
+
+TOPIC_COUNT = 1000
+TOPIC_WORDS = 50
+COMMON_WORDS = 2000
+WORDS_PER_CHUNK = 40
+GROUND_TRUTH_BATCH_SIZE = 50000
+
+
+def chunk_text(number: int) -> str:
+    """
+    Text of chunk `number`, mostly words of one topic mixed with common words,
+    so the corpus has clusters like real documents do
+    """
+    rng = np.random.default_rng(number)
+    topic = int(rng.integers(TOPIC_COUNT))
+    topic_words = rng.integers(TOPIC_WORDS, size=WORDS_PER_CHUNK * 3 // 4)
+    common_words = rng.integers(COMMON_WORDS, size=WORDS_PER_CHUNK // 4)
+
+    words = [f"topic{topic}word{word}" for word in topic_words]
+    words += [f"common{word}" for word in common_words]
+    # Keeps every chunk unique, so none are deduplicated away
+    words.append(f"chunk{number}")
+    return " ".join(words)
+
+
+def query_text(number: int) -> str:
+    # Half the words of a stored chunk
+    words = chunk_text(number).split()
+    return " ".join(words[::2])
+
+
+async def synthetic_documents(size: int):
+    for number in range(size):
+        yield {
+            "text": chunk_text(number),
+            "metadata": {
+                "document_type": "text",
+                "source": "benchmark",
+                "document_key": f"benchmark-{number // 100}",
+            },
+        }
+
+
+def create_database(path: str):
+    url = f"sqlite:///{path}"
+    alembic_config = Config(os.path.join(backend_path, "alembic.ini"))
+    alembic_config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(alembic_config, "head")
+
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def exact_neighbours(db, model: str, query_vectors: np.ndarray, k: int):
+    """
+    Exact top-k document ids for each query, streamed over the embedding cache
+    so the whole corpus never has to be in memory at once
+    """
+    distances = np.full((len(query_vectors), k), np.inf, dtype=np.float32)
+    ids = np.full((len(query_vectors), k), -1, dtype=np.int64)
+    last_id = 0
+
+    while True:
+        rows = (
+            db.query(DocumentModel.id, EmbeddingCacheModel.embedding)
+            .join(
+                EmbeddingCacheModel,
+                EmbeddingCacheModel.chunk_hash_id == DocumentModel.chunk_hash_id,
+            )
+            .filter(EmbeddingCacheModel.model == model, DocumentModel.id > last_id)
+            .order_by(DocumentModel.id)
+            .limit(GROUND_TRUTH_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            return ids
+
+        batch_ids = np.array([row.id for row in rows], dtype=np.int64)
+        batch_vectors = np.stack(
+            [np.frombuffer(row.embedding, dtype=np.float32) for row in rows]
+        )
+        batch_distances, positions = faiss.knn(
+            query_vectors, batch_vectors, min(k, len(rows))
+        )
+
+        all_distances = np.concatenate([distances, batch_distances], axis=1)
+        all_ids = np.concatenate([ids, batch_ids[positions]], axis=1)
+        order = np.argsort(all_distances, axis=1)[:, :k]
+        distances = np.take_along_axis(all_distances, order, axis=1)
+        ids = np.take_along_axis(all_ids, order, axis=1)
+
+        last_id = int(batch_ids[-1])
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(path, name))
+        for name in os.listdir(path)
+        if os.path.isfile(os.path.join(path, name))
+    )
+
+
+def rss_mb():
+    # Current resident memory where /proc is available, otherwise the peak
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(size, index_type, dimension, k, query_count, search_mode):
+    provider = HashEmbeddings(dimension)
+    set_embedding_provider(provider)
+
+    index_settings = {
+        key: value
+        for key, value in settings.get("documents", {}).items()
+        if key in DEFAULT_INDEX_SETTINGS
+    }
+
+    with tempfile.TemporaryDirectory() as path:
+        db = create_database(os.path.join(path, "db.sqlite3"))
+        index_path = os.path.join(path, "index")
+        vector_index = VectorIndex(
+            index_path,
+            dimension=dimension,
+            index_settings={**index_settings, "index_type": index_type},
+            model=provider.model_id,
+        )
+        document_manager = DocumentManager(db, vector_index=vector_index)
+
+        try:
+            start = time.perf_counter()
+            await document_manager.save_documents(
+                synthetic_documents(size), split=False
+            )
+            ingest_seconds = time.perf_counter() - start
+
+            # Fold every delta into the base, as it would be at steady state
+            start = time.perf_counter()
+            await asyncio.to_thread(vector_index.merge)
+            merge_seconds = time.perf_counter() - start
+
+            queries = np.random.default_rng(0).choice(
+                size, min(query_count, size), replace=False
+            )
+            query_texts = [query_text(int(number)) for number in queries]
+            query_vectors = np.array(
+                await provider.embed(query_texts), dtype=np.float32
+            )
+            true_ids = exact_neighbours(db, provider.model_id, query_vectors, k)
+
+            latencies = []
+            hits = 0
+            for text, truth in zip(query_texts, true_ids):
+                start = time.perf_counter()
+                results = await document_manager.similar_search(
+                    text, results=k, conversation_filter=False, search_mode=search_mode
+                )
+                latencies.append(time.perf_counter() - start)
+                hits += len({result["id"] for result in results} & set(truth.tolist()))
+
+            return {
+                "size": size,
+                "index_type": index_type,
+                "built_as": type(vector_index.inner_index).__name__,
+                "ingest_chunks_per_second": size / ingest_seconds,
+                "merge_seconds": merge_seconds,
+                "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+                "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+                "recall": hits / true_ids.size,
+                "index_mb": directory_size(index_path) / 1024 / 1024,
+                "rss_mb": rss_mb(),
+            }
+        finally:
+            db.close()
+
+
+def print_results(results, k):
+    print(
+        f"{'Chunks':>9} {'Index':<8}{'Built as':<22}{'Ingest/s':>10}{'Merge s':>9}"
+        f"{'p50 ms':>9}{'p99 ms':>9}{f'Recall@{k}':>11}{'Index MB':>10}{'RSS MB':>9}"
+    )
+    for result in results:
+        print(
+            f"{result['size']:>9} {result['index_type']:<8}{result['built_as']:<22}"
+            f"{result['ingest_chunks_per_second']:>10.0f}"
+            f"{result['merge_seconds']:>9.1f}"
+            f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+            f"{result['recall']:>11.3f}"
+            f"{result['index_mb']:>10.1f}{result['rss_mb']:>9.0f}"
+        )
+
+
+def main(args):
+    results = []
+    for size in args.sizes:
+        for index_type in args.types:
+            print(f"Benchmarking {index_type} with {size} chunks..")
+            results.append(
+                asyncio.run(
+                    run(
+                        size,
+                        index_type,
+                        args.dimension,
+                        args.k,
+                        args.queries,
+                        args.search_mode,
+                    )
+                )
+            )
+
+    print_results(results, args.k)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Document retrieval benchmark")
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        "--types", nargs="+", default=["Flat"], choices=list(INDEX_FACTORY_STRINGS)
+    )
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--search-mode", default="vector", choices=["vector", "hybrid"])
+    parser.add_argument("--output", help="Also write the results to a JSON file")
+
+    main(parser.parse_args())
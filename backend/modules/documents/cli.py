@@ -0,0 +1,188 @@
+"""
+Document index maintenance commands, run from the backend directory:
+
+    python -m modules.documents.cli report
+    python -m modules.documents.cli repair
+"""
+
+import os
+import sys
+import json
+import asyncio
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+# Like main.py, some modules import `backend.*`
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+
+import routes  # Registers every model, relationships span modules
+from database import SessionLocal
+from .models import DocumentModel
+from .services.document_service import DocumentManager
+from .services.embedding_cache import EmbeddingCache
+from .services.vector_store import INDEX_FACTORY_STRINGS, VectorIndex
+
+
+def load_document_vectors(db):
+    """
+    Returns (ids, vectors, index settings) of the document index, using float
+    embeddings from the embedding cache where the live index may be quantized
+    """
+    vector_index = DocumentManager(db).vector_index
+    ids, vectors = vector_index.get_vectors()
+
+    documents = (
+        db.query(DocumentModel.id, DocumentModel.chunk_hash_id)
+        .filter(DocumentModel.faiss_index.isnot(None))
+        .all()
+    )
+    stored_vectors = EmbeddingCache(db).get_many(
+        [doc.chunk_hash_id for doc in documents]
+    )
+    stored_vectors = {
+        doc.id: stored_vectors[doc.chunk_hash_id]
+        for doc in documents
+        if doc.chunk_hash_id in stored_vectors
+    }
+
+    vectors = vectors.copy()
+    for row, id in enumerate(ids):
+        if int(id) in stored_vectors:
+            vectors[row] = stored_vectors[int(id)]
+
+    return ids, vectors, vector_index.index_settings
+
+
+def recall(found_ids, true_ids):
+    hits = [
+        len(set(found.tolist()) & set(truth.tolist()))
+        for found, truth in zip(found_ids, true_ids)
+    ]
+    return sum(hits) / true_ids.size
+
+
+def rerank(query_vectors, candidate_ids, vectors_by_id, k):
+    reranked = []
+    for query_vector, row_ids in zip(query_vectors, candidate_ids):
+        row_ids = row_ids[row_ids != -1]
+        distances = [
+            np.sum((vectors_by_id[int(id)] - query_vector) ** 2) for id in row_ids
+        ]
+        reranked.append(row_ids[np.argsort(distances)[:k]])
+    return reranked
+
+
+def report(index_types, k=10, query_count=100, rerank_factor=4):
+    """
+    Print recall against exact search, and memory use, of each index type
+    built from the stored documents
+    """
+    db = SessionLocal()
+    try:
+        ids, vectors, index_settings = load_document_vectors(db)
+    finally:
+        db.close()
+
+    if not len(ids):
+        print("No indexed documents, nothing to report")
+        return
+
+    k = min(k, len(ids))
+    queries = np.random.default_rng(0).choice(
+        len(ids), min(query_count, len(ids)), replace=False
+    )
+    query_vectors = vectors[queries]
+    vectors_by_id = dict(zip(ids.tolist(), vectors))
+
+    # Ground truth from an exact search over the float vectors
+    exact_index = faiss.IndexFlatL2(vectors.shape[1])
+    exact_index.add(vectors)
+    _, true_positions = exact_index.search(query_vectors, k)
+    true_ids = ids[true_positions]
+
+    print(
+        f"{len(ids)} vectors, {len(queries)} queries, recall@{k}, "
+        f"re-ranking {k * rerank_factor} candidates"
+    )
+    print(
+        f"{'Index':<10}{'Built as':<28}{'Bytes/vector':>14}{'Size (MB)':>12}"
+        f"{'Recall':>10}{'Reranked':>10}{'ms/query':>10}"
+    )
+
+    for index_type in index_types:
+        with tempfile.TemporaryDirectory() as path:
+            index = VectorIndex(
+                path,
+                dimension=vectors.shape[1],
+                index_settings={
+                    **index_settings,
+                    "index_type": index_type,
+                    "mmap": False,
+                },
+            )
+            index.build(ids, vectors)
+            size = os.path.getsize(os.path.join(path, index.manifest["base"]))
+
+            built_as = type(index.inner_index).__name__
+            if index.requires_training and len(ids) < index.train_threshold:
+                built_as += f" (<{index.train_threshold})"
+
+            start = time.perf_counter()
+            _, found_ids = index.search(query_vectors, k)
+            elapsed = time.perf_counter() - start
+
+            _, candidate_ids = index.search(query_vectors, k * rerank_factor)
+            reranked_ids = rerank(query_vectors, candidate_ids, vectors_by_id, k)
+
+            print(
+                f"{index_type:<10}{built_as:<28}"
+                f"{size / len(ids):>14.0f}{size / 1024 / 1024:>12.1f}"
+                f"{recall(found_ids, true_ids):>10.3f}"
+                f"{recall(reranked_ids, true_ids):>10.3f}"
+                f"{elapsed * 1000 / len(queries):>10.2f}"
+            )
+
+
+def repair():
+    """
+    Compact the index and reconcile it with the stored documents
+    """
+    db = SessionLocal()
+    try:
+        report = asyncio.run(DocumentManager(db).repair_index())
+    finally:
+        db.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Document index maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = commands.add_parser(
+        "report", help="Compare recall and memory use of each index type"
+    )
+    report_parser.add_argument(
+        "--types", nargs="+", default=list(INDEX_FACTORY_STRINGS), help="Index types"
+    )
+    report_parser.add_argument("--k", type=int, default=10)
+    report_parser.add_argument("--queries", type=int, default=100)
+    report_parser.add_argument("--rerank-factor", type=int, default=4)
+
+    commands.add_parser(
+        "repair",
+        help="Rebuild a compact index and reconcile it with the stored documents",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.types, args.k, args.queries, args.rerank_factor)
+    elif args.command == "repair":
+        repair()
@@ -1,5 +1,17 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, JSON
-from sqlalchemy.sql import func
+import uuid
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    ForeignKey,
+    DateTime,
+    Text,
+    JSON,
+    LargeBinary,
+    UniqueConstraint,
+)
+from sqlalchemy.sql import func, table, column
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -8,11 +20,13 @@ from modules.conversations.models import conversation_document
 
 class DocumentModel(Base):
     __tablename__ = "document_model"
+    # Ids key the vectors in the index, they're never reused
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True)
     chunk_hash_id = Column(String, unique=True)
     faiss_index = Column(Integer)
-    document_key = Column(String, nullable=True)
+    document_key = Column(String, nullable=True, index=True)
     content = Column(Text)
     type = Column(String, nullable=True)
     collection = Column(String, nullable=True)
@@ -43,3 +57,64 @@ class DocumentModel(Base):
             "timestamp": self.timestamp.isoformat() if self.timestamp else None,
             "metadata": self.meta_data,
         }
+
+
+# FTS5 index over DocumentModel title & content. It's created and kept in sync
+# by triggers in migrations, so it's not part of the ORM metadata.
+document_fts = table(
+    "document_fts", column("rowid", Integer), column("rank"), column("document_fts")
+)
+
+
+class EmbeddingCacheModel(Base):
+    """
+    Embeddings stored by content hash, so a chunk is only embedded once per model
+    """
+
+    __tablename__ = "embedding_cache_model"
+    __table_args__ = (UniqueConstraint("chunk_hash_id", "model"),)
+
+    id = Column(Integer, primary_key=True)
+    chunk_hash_id = Column(String, index=True)
+    model = Column(String)
+    dimension = Column(Integer)
+    embedding = Column(LargeBinary)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class IngestionJobModel(Base):
+    """
+    A file or URL queued to be parsed, embedded and indexed in the background
+    """
+
+    __tablename__ = "ingestion_job_model"
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(Integer, ForeignKey("conversation_model.id"))
+    source_type = Column(String)
+    source = Column(String)
+    content_type = Column(String, nullable=True)
+    file_path = Column(String, nullable=True)
+    # Given to every chunk of the source, also when a resumed job re-parses it
+    document_key = Column(String, default=lambda: str(uuid.uuid4()))
+    status = Column(String, default="pending", index=True)
+    pages_parsed = Column(Integer, default=0)
+    chunks_embedded = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "conversation_id": self.conversation_id,
+            "source_type": self.source_type,
+            "source": self.source,
+            "document_key": self.document_key,
+            "status": self.status,
+            "pages_parsed": self.pages_parsed,
+            "chunks_embedded": self.chunks_embedded,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -0,0 +1,40 @@
+"""
+CPU-bound parsing steps, run in worker processes by `utils.run_in_parse_pool`.
+
+Kept free of app imports so worker processes start quickly.
+"""
+
+import hashlib
+from functools import lru_cache
+
+import pypdf
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+def count_pdf_pages(file_path):
+    with open(file_path, "rb") as pdf_file:
+        return len(pypdf.PdfReader(pdf_file).pages)
+
+
+def extract_pdf_pages(file_path, start, stop):
+    """
+    Returns the text of pages [start, stop) of a PDF
+    """
+    with open(file_path, "rb") as pdf_file:
+        reader = pypdf.PdfReader(pdf_file)
+        return [reader.pages[number].extract_text() for number in range(start, stop)]
+
+
+@lru_cache
+def _get_text_splitter(chunk_size):
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+
+
+def split_text(text, chunk_size):
+    """
+    Returns (chunk, sha256 hash) pairs for `text`
+    """
+    return [
+        (chunk, hashlib.sha256(chunk.encode()).hexdigest())
+        for chunk in _get_text_splitter(chunk_size).split_text(text)
+    ]
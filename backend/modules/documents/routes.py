@@ -1,21 +1,40 @@
-from fastapi import HTTPException, APIRouter, Body, UploadFile, File, Depends
+from typing import Optional
+
+from fastapi import HTTPException, APIRouter, Body, UploadFile, File, Depends, Query
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from .models import *
 from .services.document_service import DocumentManager
+from .services.ingestion_service import IngestionService, ingestion_queue
 from database import get_db
 
 router = APIRouter()
 
 
+@router.post("/documents/index/repair")
+async def repair_index(db: Session = Depends(get_db)):
+    """Compact the document index and reconcile it with the stored documents"""
+    document_manager = DocumentManager(db)
+    report = await document_manager.repair_index()
+
+    return JSONResponse(content=report)
+
+
 @router.get("/documents/{conversation_id}")
-async def get_documents(conversation_id: int, db: Session = Depends(get_db)):
-    """Get a conversation's documents"""
+async def get_documents(
+    conversation_id: int,
+    conversation_only: bool = False,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """Get a page of documents, optionally only those of the conversation"""
     document_manager = DocumentManager(db, conversation_id)
-    documents = document_manager.get_documents(conversation_only=False)
+    documents = document_manager.get_documents(conversation_only, limit, offset)
+    total = document_manager.count_documents(conversation_only)
 
-    return JSONResponse(content=documents)
+    return JSONResponse(content=documents, headers={"X-Total-Count": str(total)})
 
 
 @router.patch("/documents/{doc_key}/conversations/{conversation_id}")
@@ -48,21 +67,38 @@ async def delete_document(doc_key: str, db: Session = Depends(get_db)):
 async def upload_document(
     conversation_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)
 ):
-    """Create a new document from a file"""
-    document_manager = DocumentManager(db, conversation_id)
-    try:
-        await document_manager.load_files([file])
-        return JSONResponse(status_code=200, content={"detail": "success"})
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    """Queue a new document from a file, returns the ingestion job"""
+    job = await IngestionService(db).create_file_job(conversation_id, file)
+    ingestion_queue.enqueue(job)
+
+    return JSONResponse(status_code=202, content=job.serialize())
 
 
 @router.post("/documents/{conversation_id}/add_url")
 async def upload_url(
     conversation_id: int, url: str = Body(...), db: Session = Depends(get_db)
 ):
-    """Create a new document from a URL"""
-    document_manager = DocumentManager(db, conversation_id)
-    await document_manager.load_url(url)
+    """Queue a new document from a URL, returns the ingestion job"""
+    job = IngestionService(db).create_url_job(conversation_id, url)
+    ingestion_queue.enqueue(job)
+
+    return JSONResponse(status_code=202, content=job.serialize())
+
+
+@router.get("/documents/{conversation_id}/jobs")
+async def get_ingestion_jobs(conversation_id: int, db: Session = Depends(get_db)):
+    """Get a conversation's ingestion jobs, newest first"""
+    jobs = IngestionService(db).get_jobs_by_conversation(conversation_id)
+
+    return JSONResponse(content=[job.serialize() for job in jobs])
+
+
+@router.get("/documents/jobs/{job_id}")
+async def get_ingestion_job(job_id: int, db: Session = Depends(get_db)):
+    """Get the status & progress of an ingestion job"""
+    job = IngestionService(db).get_job(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
 
-    return JSONResponse(status_code=200, content={"detail": "success"})
+    return JSONResponse(content=job.serialize())
@@ -1,58 +1,245 @@
+import re
+import asyncio
 import hashlib
 from typing import List, Optional
 
+from sqlalchemy import func, or_
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 import numpy as np
-import faiss
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
 
+from config import settings
 from database import SessionLocal
-from modules.conversations.services.llm_connector import get_embeddings
+from modules.llms.services.embedding_service import get_embeddings
 from modules.conversations.services.conversation_service import ConversationService
 from modules.conversations.models import ConversationModel
 from ..models import *
 from ..utils import *
+from ..parsing import split_text
+from .vector_store import get_vector_index
+from .embedding_cache import EmbeddingCache, QUERY_BATCH_SIZE
+from .search_cache import search_cache
+
+# Rank constant for reciprocal rank fusion, dampens the weight of top ranks
+RRF_K = 60
+
+
+def get_stored_vectors(ids: np.ndarray) -> dict:
+    """
+    Full precision embeddings of the chunks with the given ids, from the
+    embedding cache. Lets index rebuilds skip decoding quantized vectors.
+    """
+    db = SessionLocal()
+    try:
+        wanted_ids = set(ids.tolist())
+        chunk_hash_ids = {
+            doc.chunk_hash_id: doc.id
+            for doc in DocumentService(db).get_index_states()
+            if doc.id in wanted_ids
+        }
+        cached = EmbeddingCache(db).get_many(chunk_hash_ids)
+        return {
+            chunk_hash_ids[chunk_hash_id]: embedding
+            for chunk_hash_id, embedding in cached.items()
+        }
+    finally:
+        db.close()
+
+
+def get_document_index():
+    """
+    Returns the shared document index
+    """
+    return get_vector_index(vector_source=get_stored_vectors)
+
+
+async def _iterate(documents):
+    # Iterate lists and async generators alike
+    if hasattr(documents, "__aiter__"):
+        async for document in documents:
+            yield document
+    else:
+        for document in documents:
+            yield document
 
 
 class DocumentManager:
-    def __init__(self, db=None, conversation_id=None):
+    def __init__(self, db=None, conversation_id=None, vector_index=None):
         self.db = db if db else SessionLocal()
         self.conversation_id = conversation_id
-        self.faiss_path = None
-        self.faiss_index = None
-        self.load_faiss_index()
+        self.vector_index = vector_index or get_document_index()
 
-    def load_faiss_index(self):
-        current_path = os.path.dirname(os.path.realpath(__file__))
-        data_path = os.path.join(current_path, "..", "..", "..", "data")
-        self.faiss_path = os.path.join(data_path, "faiss_index.bin")
+        if self.vector_index.model_changed:
+            self.migrate_embedding_model()
+        elif self.vector_index.is_positional:
+            self.migrate_positional_index()
 
-        if os.path.exists(self.faiss_path):
-            self.faiss_index = faiss.read_index(self.faiss_path)
-        else:
-            self.faiss_index = self.create_faiss_index()
-            self.save_index_to_disk()
+    def migrate_embedding_model(self):
+        """
+        Start over with an empty index after the embedding model has changed.
+        Every chunk is marked unindexed, `index_unindexed_documents` re-embeds them.
+        """
+        print("Embedding model changed, the document index will be rebuilt..")
+        DocumentService(self.db).clear_faiss_indices()
+        self.vector_index.reset()
+        search_cache.invalidate()
 
-    def create_faiss_index(self):
-        index = faiss.IndexFlatL2(1536)
-        return index
+    async def index_unindexed_documents(self):
+        """
+        Embed and index stored chunks that aren't in the index yet, in batches
+        """
+        batch_size = settings.get("documents", {}).get("ingest_batch_size", 1000)
+        document_service = DocumentService(self.db)
+        indexed_count = 0
+
+        while documents := document_service.get_unindexed_documents(batch_size):
+            embeddings = await EmbeddingCache(self.db).get_embeddings(
+                {doc.chunk_hash_id: doc.content for doc in documents}
+            )
+            ids = np.array([doc.id for doc in documents], dtype=np.int64)
+            vectors = np.array(
+                [embeddings[doc.chunk_hash_id] for doc in documents], dtype=np.float32
+            )
+
+            await asyncio.to_thread(self.vector_index.add, vectors, ids)
+            document_service.set_faiss_indices_by_ids(ids.tolist())
+            self.db.commit()
+            search_cache.invalidate()
+
+            indexed_count += len(documents)
+            print(f"Indexed {indexed_count} stored chunks")
+
+        return indexed_count
+
+    async def repair_index(self):
+        """
+        Rebuild a compact index, without deleted vectors, and reconcile every
+        chunk's `faiss_index` with it. Searches keep using the old index until
+        the new one is swapped in. Returns a report of what was fixed.
+        """
+        document_service = DocumentService(self.db)
+        embedding_cache = EmbeddingCache(self.db)
+        report = {}
+        to_index = []
+        to_clear = []
 
-    def save_index_to_disk(self):
-        faiss.write_index(self.faiss_index, self.faiss_path)
+        def select(ids, vectors):
+            # Runs while index writes are held off, chunks are only committed
+            # after their vectors are added so the two can be compared
+            documents = document_service.get_index_states()
+            documents_by_id = {doc.id: doc for doc in documents}
+            vectors_by_id = dict(zip(ids.tolist(), vectors))
+
+            orphans = [id for id in vectors_by_id if id not in documents_by_id]
+            missing = [
+                doc
+                for doc in documents
+                if doc.id not in vectors_by_id and doc.faiss_index is not None
+            ]
+
+            # Float embeddings are more accurate than vectors decoded from a
+            # quantized index, and can stand in for missing vectors
+            lookups = missing
+            if self.vector_index.is_quantized:
+                lookups = documents
+            cached = embedding_cache.get_many([doc.chunk_hash_id for doc in lookups])
+            for doc in lookups:
+                if doc.chunk_hash_id in cached:
+                    vectors_by_id[doc.id] = cached[doc.chunk_hash_id]
+
+            to_index.extend(
+                doc.id
+                for doc in documents
+                if doc.id in vectors_by_id and doc.faiss_index != doc.id
+            )
+            to_clear.extend(doc.id for doc in missing if doc.id not in vectors_by_id)
+
+            report.update(
+                {
+                    "documents": len(documents),
+                    "vectors_before": len(ids),
+                    "orphaned_vectors": len(orphans),
+                    "orphaned_vector_ids": sorted(orphans)[:100],
+                    "drifted_documents": sum(
+                        1
+                        for doc in documents
+                        if doc.faiss_index is not None
+                        and doc.faiss_index != doc.id
+                        and doc.id in vectors_by_id
+                    ),
+                    "restored_vectors": sum(
+                        1 for doc in missing if doc.id in vectors_by_id
+                    ),
+                }
+            )
+
+            keep_ids = np.array(
+                [id for id in vectors_by_id if id in documents_by_id], dtype=np.int64
+            )
+            keep_vectors = np.array(
+                [vectors_by_id[id] for id in keep_ids.tolist()], dtype=np.float32
+            ).reshape(-1, self.vector_index.dimension)
+            return keep_ids, keep_vectors
+
+        try:
+            report["vectors_after"] = await asyncio.to_thread(
+                self.vector_index.compact, select
+            )
+            document_service.set_faiss_indices_by_ids(to_index)
+            document_service.clear_faiss_indices(to_clear)
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            search_cache.invalidate()
+
+        # Chunks with no vector left anywhere are embedded again
+        report["reembedded_documents"] = await self.index_unindexed_documents()
+        print(f"Repaired document index: {report}")
+
+        return report
+
+    def migrate_positional_index(self):
+        """
+        Re-key an index created before vectors were keyed by document id
+        """
+        documents = DocumentService(self.db).get_indexed_documents()
+        print(f"Migrating document index to stable ids ({len(documents)} chunks)..")
+
+        self.vector_index.assign_ids({doc.faiss_index: doc.id for doc in documents})
+        DocumentService(self.db).set_faiss_indices(documents)
 
     """
     Document processing methods
     """
 
-    async def save_documents(self, documents, split=True, chunk_size=1500):
-        document_service = DocumentService(self.db)
-        embeddings = []
+    async def save_documents(
+        self, documents, split=True, chunk_size=1500, progress=None
+    ):
+        """
+        Chunk, embed and index documents. `documents` can be a list or an async
+        generator, chunks are saved in batches as they're produced, so memory
+        use stays flat no matter how large the input is.
+
+        `progress` is awaited with (pages parsed, chunks saved) after each batch.
+        Chunks count whether they were embedded or were already stored, so the
+        last call reports every chunk of the source, even when it's resumed.
+        Returns the same counts.
+        """
+        batch_size = settings.get("documents", {}).get("ingest_batch_size", 1000)
+        conversation = ConversationService(self.db).get_conversation_by_id(
+            self.conversation_id
+        )
+        conversation_id = conversation.id if conversation else None
+
+        page_count = 0
+        chunk_count = 0
         metadatas = []
-        print(f"Saving {len(documents)} documents")
-        for document in documents:
+        async for document in _iterate(documents):
+            page_count += 1
             if isinstance(document, Document):
                 text = document.page_content
                 document_metadata = document.metadata
@@ -64,20 +251,12 @@ class DocumentManager:
                 continue
 
             if split:
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=chunk_size, chunk_overlap=0
-                )
-                text_chunks = text_splitter.split_text(text)
+                # Splitting & hashing are CPU-bound, keep them off the event loop
+                text_chunks = await run_in_parse_pool(split_text, text, chunk_size)
             else:
-                text_chunks = [text]
+                text_chunks = [(text, hashlib.sha256(text.encode()).hexdigest())]
 
-            for text_chunk in text_chunks:
-                chunk_hash_id = str(hashlib.sha256(text_chunk.encode()).hexdigest())
-                print("Creating embeddings..")
-                embedding = get_embeddings(text_chunk)
-
-                # Store the embedding and metadata
-                embeddings.append(embedding)
+            for text_chunk, chunk_hash_id in text_chunks:
                 metadata = {
                     "id": chunk_hash_id,
                     "type": document_metadata.get("document_type"),
@@ -90,47 +269,140 @@ class DocumentManager:
                 }
                 metadatas.append(metadata)
 
-        # Add embeddings to the Faiss index
-        if embeddings:
-            self.faiss_index.add(np.array(embeddings, dtype=np.float32))
-        else:
+                if len(metadatas) >= batch_size:
+                    await self.save_chunks(metadatas, conversation_id)
+                    chunk_count += len(metadatas)
+                    metadatas = []
+                    if progress:
+                        await progress(page_count, chunk_count)
+
+        if metadatas:
+            await self.save_chunks(metadatas, conversation_id)
+            chunk_count += len(metadatas)
+
+        if progress:
+            await progress(page_count, chunk_count)
+
+        if not chunk_count:
             raise Exception("No usuable text extracted!")
 
-        # Save the Faiss index to disk
-        self.save_index_to_disk()
+        print(f"Saved {chunk_count} chunks")
+        return page_count, chunk_count
 
-        for i, metadata in enumerate(metadatas):
-            doc_chunk = document_service.create_document(
-                metadata, self.faiss_index.ntotal - len(metadatas) + i
-            )
+    async def save_chunks(self, metadatas, conversation_id=None):
+        """
+        Embed, store and index one batch of chunk metadata in a single transaction
+        """
+        try:
+            await self._save_chunks(metadatas, conversation_id)
+        finally:
+            search_cache.invalidate()
 
-            # Associate the document with the conversation
-            conversation = ConversationService(self.db).get_conversation_by_id(
-                self.conversation_id
+    async def _save_chunks(self, metadatas, conversation_id=None):
+        document_service = DocumentService(self.db)
+        print(f"Saving {len(metadatas)} chunks")
+
+        # Chunks we've already stored only need to be linked to the conversation
+        existing_documents = document_service.get_documents_by_hashes(
+            [metadata["id"] for metadata in metadatas]
+        )
+        linked_ids = [doc_chunk.id for doc_chunk in existing_documents]
+
+        existing_hashes = {doc_chunk.chunk_hash_id for doc_chunk in existing_documents}
+        new_metadatas = {}
+        for metadata in metadatas:
+            if metadata["id"] not in existing_hashes:
+                new_metadatas.setdefault(metadata["id"], metadata)
+        new_metadatas = list(new_metadatas.values())
+
+        # Embed before writing anything, so the write transaction below isn't
+        # held open across embedding requests
+        embeddings = {}
+        if new_metadatas:
+            print(f"Creating embeddings for {len(new_metadatas)} chunks..")
+            embeddings = await EmbeddingCache(self.db).get_embeddings(
+                {metadata["id"]: metadata["content"] for metadata in new_metadatas}
             )
+        else:
+            print("All chunks already stored, nothing to embed")
 
-            if conversation:
-                document_service.add_document_to_conversation(conversation, doc_chunk)
+        ids = np.array([], dtype=np.int64)
+        try:
+            # Store the chunks first, their row ids become their vector ids
+            created = document_service.bulk_create_documents(new_metadatas)
+
+            # Chunks stored concurrently by someone else are skipped by the
+            # insert, but still linked
+            skipped_hashes = [
+                metadata["id"]
+                for metadata in new_metadatas
+                if metadata["id"] not in created
+            ]
+            if skipped_hashes:
+                linked_ids.extend(
+                    doc_chunk.id
+                    for doc_chunk in document_service.get_documents_by_hashes(
+                        skipped_hashes
+                    )
+                )
+
+            if conversation_id:
+                document_service.bulk_add_documents_to_conversation(
+                    conversation_id, linked_ids + list(created.values())
+                )
+
+            if created:
+                vectors = np.array(
+                    [embeddings[chunk_hash_id] for chunk_hash_id in created],
+                    dtype=np.float32,
+                )
+                # Add embeddings to the shared Faiss index, which also persists
+                # it to disk
+                added_ids = np.array(list(created.values()), dtype=np.int64)
+                await asyncio.to_thread(self.vector_index.add, vectors, added_ids)
+                ids = added_ids
+                document_service.set_faiss_indices_by_ids(ids.tolist())
+
+            self.db.commit()
+        except Exception:
+            # Don't leave vectors behind for chunks that weren't stored
+            self.db.rollback()
+            if len(ids):
+                self.vector_index.remove(ids)
+            raise
 
     """
     Loader methods
     """
 
-    async def load_url(self, url):
-        docs = await url_loader([url])
-        await self.save_documents(docs)
-
-    async def load_files(self, files):
-        docs = []
+    async def load_url(self, url, progress=None, document_key=None):
+        await self.save_documents(
+            url_loader([url], document_key=document_key), progress=progress
+        )
 
+    async def load_files(self, files, progress=None, document_key=None):
+        """
+        Save uploaded files. A `document_key`, if given, is used for every file,
+        so only pass one with a single file.
+        """
+        # Start parsing every file now, so later files are parsed in parallel
+        # while earlier ones are embedded & saved
+        loaded_files = []
         for file in files:
             print(f"{file.filename} => {file.content_type}")
+            docs = []
             if file.content_type == "application/pdf":
-                docs = await pdf_loader([file])
+                docs = PrefetchedDocuments(
+                    pdf_loader([file], document_key=document_key)
+                )
             elif file.content_type == "text/plain":
-                docs = await text_loader([file])
+                docs = PrefetchedDocuments(
+                    text_loader([file], document_key=document_key)
+                )
             elif file.content_type == "application/json":
-                docs = await text_loader([file])
+                docs = PrefetchedDocuments(
+                    text_loader([file], document_key=document_key)
+                )
             elif file.content_type == "text/csv":
                 pass
             elif (
@@ -143,73 +415,204 @@ class DocumentManager:
                 == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             ):
                 pass
+            loaded_files.append(docs)
+
+        # Counts carry on across files, so progress covers the whole upload
+        page_offset = chunk_offset = 0
 
-        await self.save_documents(docs)
+        async def file_progress(page_count, chunk_count):
+            await progress(page_offset + page_count, chunk_offset + chunk_count)
+
+        try:
+            for docs in loaded_files:
+                page_count, chunk_count = await self.save_documents(
+                    docs, progress=file_progress if progress else None
+                )
+                page_offset += page_count
+                chunk_offset += chunk_count
+        finally:
+            for docs in loaded_files:
+                if isinstance(docs, PrefetchedDocuments):
+                    docs.cancel()
 
     """
     Search & document discovery
     """
 
-    def similar_search(self, text, results=10, recent=False, conversation_filter=True):
-        embeddings = get_embeddings(text)
+    async def similar_search(
+        self,
+        text,
+        results=10,
+        recent=False,
+        conversation_filter=True,
+        collection=None,
+        document_type=None,
+        search_mode=None,
+    ):
+        """
+        Find the documents most similar to `text`. The "hybrid" search mode also
+        runs a full-text (BM25) search and fuses both rankings, which catches
+        exact identifiers, error codes and names that embeddings tend to miss.
+        """
+        if search_mode is None:
+            search_mode = settings.get("documents", {}).get("search_mode", "vector")
+
+        # The same message is searched again on regenerations & tool follow-ups
+        scope = (
+            self.conversation_id if conversation_filter else None,
+            collection,
+            document_type,
+            results,
+            recent,
+            search_mode,
+        )
+        cache_key = search_cache.results_key(text, scope, self.vector_index.generation)
+        cached_results = search_cache.results.get(cache_key)
+        if cached_results is not None:
+            return [dict(result) for result in cached_results]
+
+        embedding_key = search_cache.embedding_key(text, self.vector_index.model)
+        embeddings = search_cache.embeddings.get(embedding_key)
+        if embeddings is None:
+            embeddings = await get_embeddings(text)
+            search_cache.embeddings.put(embedding_key, embeddings)
         search_vector = np.array([embeddings], dtype=np.float32)
 
+        # Restrict the search to in-scope vectors inside the index itself
+        allowed_ids = None
+        if conversation_filter or collection or document_type:
+            allowed_ids = DocumentService(self.db).get_faiss_indices_in_scope(
+                conversation_id=self.conversation_id if conversation_filter else None,
+                collection=collection,
+                document_type=document_type,
+            )
+            if not allowed_ids:
+                return []
+
+        # Quantized indexes return approximate distances, so fetch extra
+        # candidates and re-rank them against their stored float vectors
+        rerank_factor = self.vector_index.index_settings["rerank_factor"]
+        candidates = results * rerank_factor if rerank_factor > 1 else results
+
         # Query the Faiss index to find the most similar embeddings, and get distances
-        distances, index_positions = self.faiss_index.search(search_vector, results)
+        distances, index_positions = await asyncio.to_thread(
+            self.vector_index.search, search_vector, candidates, allowed_ids
+        )
 
         # Retrieve the associated metadata for the most similar embeddings from the database
         found_documents = DocumentService(self.db).get_documents_by_faiss_indices(
-            index_positions[0],
-            self.conversation_id if conversation_filter else None,
+            index_positions[0]
         )
+        documents_by_index = {doc.faiss_index: doc for doc in found_documents}
+
+        # Pair each hit with its own distance, in order of similarity
+        hits = [
+            (documents_by_index[int(index)], float(dist))
+            for index, dist in zip(index_positions[0], distances[0])
+            if int(index) in documents_by_index
+        ]
+
+        if rerank_factor > 1:
+            hits = self.rerank(search_vector[0], hits)
+
+        if search_mode == "hybrid":
+            lexical_hits = DocumentService(self.db).search_fulltext(
+                text,
+                candidates,
+                conversation_id=self.conversation_id if conversation_filter else None,
+                collection=collection,
+                document_type=document_type,
+            )
+            hits = self.fuse_rankings(hits, lexical_hits)
+
+        hits = hits[:results]
 
         if recent:
-            found_documents.sort(key=lambda x: x.timestamp, reverse=True)
+            hits.sort(key=lambda hit: hit[0].timestamp, reverse=True)
 
         # Serialize the results and add similarity scores
+        # Full-text only hits have no vector distance
         results = [
-            {**doc.serialize(), "similarity_score": 1 / (1 + float(dist))}
-            for doc, dist in zip(found_documents, distances[0])
+            {
+                **doc.serialize(),
+                "similarity_score": 1 / (1 + dist) if dist is not None else None,
+            }
+            for doc, dist in hits
         ]
+        search_cache.results.put(cache_key, [dict(result) for result in results])
 
         return results
 
-    def get_documents(self, conversation_only=False):
+    def rerank(self, search_vector, hits):
         """
-        Get a list of available documents for management on frontend
+        Re-order (document, distance) hits by exact distance to `search_vector`,
+        using the float embeddings kept in the embedding cache
         """
-        if conversation_only:
-            conversation = ConversationService(self.db).get_conversation_by_id(
-                self.conversation_id
-            )
-            if conversation:
-                document_chunks = conversation.documents
-            else:
-                document_chunks = []
-        else:
-            document_chunks = DocumentService(self.db).get_all_documents()
-
-        output = []
-        seen_document_keys = set()
-
-        for doc in document_chunks:
-            # Fetch the associated conversation IDs
-            conversation_ids = [c.id for c in doc.conversations]
-
-            document_data = {
-                "id": doc.id,
-                "conversation_ids": conversation_ids,
-                "document_key": doc.document_key,
-                "title": doc.title,
-                "source": doc.source,
-                "type": doc.type,
-            }
+        stored_vectors = EmbeddingCache(self.db).get_many(
+            [doc.chunk_hash_id for doc, _ in hits]
+        )
+
+        reranked = []
+        for doc, dist in hits:
+            stored_vector = stored_vectors.get(doc.chunk_hash_id)
+            if stored_vector is not None:
+                # Squared L2, like the distances FAISS returns
+                dist = float(np.sum((stored_vector - search_vector) ** 2))
+            reranked.append((doc, dist))
+
+        return sorted(reranked, key=lambda hit: hit[1])
+
+    def fuse_rankings(self, vector_hits, lexical_hits):
+        """
+        Merge (document, distance) vector hits with full-text hits using
+        reciprocal rank fusion
+        """
+        documents = {}
+        distances = {}
+        scores = {}
+
+        for doc, dist in vector_hits:
+            documents[doc.id] = doc
+            distances[doc.id] = dist
+        for doc in lexical_hits:
+            documents[doc.id] = doc
+
+        for ranking in ([doc for doc, _ in vector_hits], lexical_hits):
+            for rank, doc in enumerate(ranking, start=1):
+                scores[doc.id] = scores.get(doc.id, 0) + 1 / (RRF_K + rank)
+
+        ranked_ids = sorted(scores, key=scores.get, reverse=True)
+        return [(documents[id], distances.get(id)) for id in ranked_ids]
+
+    def get_documents(self, conversation_only=False, limit=None, offset=0):
+        """
+        Get a list of available documents for management on frontend, one entry
+        per document with the conversations any of its chunks are linked to
+        """
+        document_service = DocumentService(self.db)
+        conversation_id = self.conversation_id if conversation_only else None
 
-            if doc.document_key not in seen_document_keys:
-                output.append(document_data)
-                seen_document_keys.add(doc.document_key)
+        groups = document_service.get_document_groups(conversation_id, limit, offset)
+        conversation_ids = document_service.get_conversation_ids_by_document_key(
+            [group.document_key for group in groups]
+        )
 
-        return output
+        return [
+            {
+                "id": group.id,
+                "conversation_ids": conversation_ids.get(group.document_key, []),
+                "document_key": group.document_key,
+                "title": group.title,
+                "source": group.source,
+                "type": group.type,
+                "chunk_count": group.chunk_count,
+            }
+            for group in groups
+        ]
+
+    def count_documents(self, conversation_only=False):
+        conversation_id = self.conversation_id if conversation_only else None
+        return DocumentService(self.db).count_document_groups(conversation_id)
 
     """
     Utility methods
@@ -226,10 +629,11 @@ class DocumentManager:
             )
 
             if conversation:
-                for document in documents:
-                    DocumentService(self.db).add_document_to_conversation(
-                        conversation, document
-                    )
+                DocumentService(self.db).bulk_add_documents_to_conversation(
+                    conversation.id, [document.id for document in documents]
+                )
+                self.db.commit()
+                search_cache.invalidate()
 
     def remove_conversation_id(self, document_key):
         documents = DocumentService(self.db).get_documents_by_key(
@@ -246,6 +650,7 @@ class DocumentManager:
                     DocumentService(self.db).remove_document_from_conversation(
                         conversation, document
                     )
+                search_cache.invalidate()
 
     def delete_documents(self, document_key):
         # Get all documents with the given document key
@@ -253,19 +658,25 @@ class DocumentManager:
             document_key=document_key
         )
 
-        # Remove the corresponding documents from the Faiss index
-        faiss_indexes_to_remove = [doc.faiss_index for doc in documents_to_delete]
-        self.faiss_index.remove_ids(np.array(faiss_indexes_to_remove, dtype=np.int64))
+        # Remove the corresponding vectors from the Faiss index, persisted to disk
+        faiss_indexes_to_remove = [
+            doc.faiss_index
+            for doc in documents_to_delete
+            if doc.faiss_index is not None
+        ]
+        if faiss_indexes_to_remove:
+            self.vector_index.remove(np.array(faiss_indexes_to_remove, dtype=np.int64))
 
         # Delete the filtered documents from database
         DocumentService(self.db).delete_documents_by_key(document_key=document_key)
+        search_cache.invalidate()
 
 
 class DocumentService:
     def __init__(self, db: Session):
         self.db = db
 
-    def create_document(self, metadata: dict, faiss_index: int):
+    def create_document(self, metadata: dict, faiss_index: Optional[int] = None):
         try:
             doc_model = DocumentModel(
                 chunk_hash_id=metadata["id"],
@@ -286,6 +697,109 @@ class DocumentService:
             )
             self.db.rollback()
 
+    def bulk_create_documents(self, metadatas: List[dict]) -> dict:
+        """
+        Insert chunks with multi-row inserts, skipping chunk hashes that already
+        exist. Doesn't commit. Returns {chunk_hash_id: id} of the inserted rows.
+        """
+        created = {}
+        for i in range(0, len(metadatas), QUERY_BATCH_SIZE):
+            rows = [
+                {
+                    "chunk_hash_id": metadata["id"],
+                    "type": metadata["type"],
+                    "collection": metadata["collection"],
+                    "title": metadata["title"],
+                    "content": metadata["content"],
+                    "source": metadata["source"],
+                    "document_key": metadata["document_key"],
+                }
+                for metadata in metadatas[i : i + QUERY_BATCH_SIZE]
+            ]
+            statement = (
+                sqlite_insert(DocumentModel)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["chunk_hash_id"])
+                .returning(DocumentModel.chunk_hash_id, DocumentModel.id)
+            )
+            created.update(
+                {row.chunk_hash_id: row.id for row in self.db.execute(statement)}
+            )
+
+        # Keep the input order, the returned order isn't guaranteed
+        return {
+            metadata["id"]: created[metadata["id"]]
+            for metadata in metadatas
+            if metadata["id"] in created
+        }
+
+    def bulk_add_documents_to_conversation(
+        self, conversation_id: int, document_ids: List[int]
+    ):
+        """
+        Link documents to a conversation, skipping existing links. Doesn't commit.
+        """
+        for i in range(0, len(document_ids), QUERY_BATCH_SIZE):
+            rows = [
+                {"conversation_id": conversation_id, "document_id": document_id}
+                for document_id in document_ids[i : i + QUERY_BATCH_SIZE]
+            ]
+            self.db.execute(
+                sqlite_insert(conversation_document)
+                .values(rows)
+                .on_conflict_do_nothing(
+                    index_elements=["conversation_id", "document_id"]
+                )
+            )
+
+    def set_faiss_indices_by_ids(self, document_ids: List[int]):
+        # Vectors are keyed by the document's own id. Doesn't commit.
+        for i in range(0, len(document_ids), QUERY_BATCH_SIZE):
+            self.db.query(DocumentModel).filter(
+                DocumentModel.id.in_(document_ids[i : i + QUERY_BATCH_SIZE])
+            ).update(
+                {DocumentModel.faiss_index: DocumentModel.id}, synchronize_session=False
+            )
+
+    def clear_faiss_indices(self, document_ids: Optional[List[int]] = None):
+        # Marks chunks unindexed, all of them unless `document_ids` is given
+        if document_ids is None:
+            self.db.query(DocumentModel).update(
+                {DocumentModel.faiss_index: None}, synchronize_session=False
+            )
+        for i in range(0, len(document_ids or []), QUERY_BATCH_SIZE):
+            self.db.query(DocumentModel).filter(
+                DocumentModel.id.in_(document_ids[i : i + QUERY_BATCH_SIZE])
+            ).update({DocumentModel.faiss_index: None}, synchronize_session=False)
+        self.db.commit()
+
+    def get_index_states(self):
+        return self.db.query(
+            DocumentModel.id, DocumentModel.chunk_hash_id, DocumentModel.faiss_index
+        ).all()
+
+    def get_unindexed_documents(self, limit: int):
+        return (
+            self.db.query(DocumentModel)
+            .filter(DocumentModel.faiss_index.is_(None))
+            .order_by(DocumentModel.id)
+            .limit(limit)
+            .all()
+        )
+
+    def set_faiss_indices(self, documents: List[DocumentModel]):
+        # Mark chunks as indexed, vectors are keyed by the document's own id
+        for document in documents:
+            document.faiss_index = document.id
+        self.db.commit()
+
+    def get_indexed_documents(self):
+        return (
+            self.db.query(DocumentModel)
+            .filter(DocumentModel.faiss_index.isnot(None))
+            .all()
+        )
+
     def get_all_documents(self):
         return self.db.query(DocumentModel).all()
 
@@ -305,6 +819,166 @@ class DocumentService:
 
         return base_query.all()
 
+    def _filter_scope(
+        self,
+        query,
+        conversation_id: Optional[int] = None,
+        collection: Optional[str] = None,
+        document_type: Optional[str] = None,
+    ):
+        if conversation_id is not None:
+            query = query.join(
+                conversation_document,
+                conversation_document.c.document_id == DocumentModel.id,
+            ).filter(conversation_document.c.conversation_id == conversation_id)
+        if collection is not None:
+            query = query.filter(DocumentModel.collection == collection)
+        if document_type is not None:
+            query = query.filter(DocumentModel.type == document_type)
+        return query
+
+    def get_faiss_indices_in_scope(
+        self,
+        conversation_id: Optional[int] = None,
+        collection: Optional[str] = None,
+        document_type: Optional[str] = None,
+    ) -> List[int]:
+        query = self.db.query(DocumentModel.faiss_index).filter(
+            DocumentModel.faiss_index.isnot(None)
+        )
+        query = self._filter_scope(query, conversation_id, collection, document_type)
+
+        return [row.faiss_index for row in query.all()]
+
+    def search_fulltext(
+        self,
+        text: str,
+        limit: int,
+        conversation_id: Optional[int] = None,
+        collection: Optional[str] = None,
+        document_type: Optional[str] = None,
+    ) -> List[DocumentModel]:
+        """
+        Full-text search over document titles & content, best BM25 match first
+        """
+        # Quote every term so user input can't be parsed as FTS5 query syntax
+        terms = re.findall(r"\w+", text)
+        if not terms:
+            return []
+        match_query = " OR ".join(f'"{term}"' for term in terms)
+
+        query = (
+            self.db.query(DocumentModel)
+            .join(document_fts, document_fts.c.rowid == DocumentModel.id)
+            .filter(document_fts.c.document_fts.op("MATCH")(match_query))
+            .filter(DocumentModel.faiss_index.isnot(None))
+        )
+        query = self._filter_scope(query, conversation_id, collection, document_type)
+
+        return query.order_by(document_fts.c.rank).limit(limit).all()
+
+    def get_documents_by_hashes(self, chunk_hash_ids: List[str]):
+        documents = []
+        for i in range(0, len(chunk_hash_ids), QUERY_BATCH_SIZE):
+            documents += (
+                self.db.query(DocumentModel)
+                .filter(
+                    DocumentModel.chunk_hash_id.in_(
+                        chunk_hash_ids[i : i + QUERY_BATCH_SIZE]
+                    )
+                )
+                .all()
+            )
+        return documents
+
+    def _document_groups_query(self, conversation_id: Optional[int] = None):
+        # One row per document key, with its first chunk's id and its chunk count
+        query = self.db.query(
+            DocumentModel.document_key,
+            func.min(DocumentModel.id).label("id"),
+            func.count(DocumentModel.id).label("chunk_count"),
+        )
+        if conversation_id is not None:
+            linked_keys = (
+                self.db.query(DocumentModel.document_key)
+                .join(
+                    conversation_document,
+                    conversation_document.c.document_id == DocumentModel.id,
+                )
+                .filter(conversation_document.c.conversation_id == conversation_id)
+            )
+            query = query.filter(DocumentModel.document_key.in_(linked_keys))
+
+        return query.group_by(DocumentModel.document_key)
+
+    def get_document_groups(
+        self,
+        conversation_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ):
+        """
+        A page of documents in the order they were added, described by their
+        first chunk
+        """
+        groups = self._document_groups_query(conversation_id)
+        groups = groups.order_by(func.min(DocumentModel.id)).offset(offset)
+        if limit is not None:
+            groups = groups.limit(limit)
+        groups = groups.subquery()
+
+        return (
+            self.db.query(
+                groups.c.id,
+                groups.c.document_key,
+                groups.c.chunk_count,
+                DocumentModel.title,
+                DocumentModel.source,
+                DocumentModel.type,
+            )
+            .join(DocumentModel, DocumentModel.id == groups.c.id)
+            .order_by(groups.c.id)
+            .all()
+        )
+
+    def count_document_groups(self, conversation_id: Optional[int] = None):
+        return self._document_groups_query(conversation_id).count()
+
+    def get_conversation_ids_by_document_key(self, document_keys: List[str]):
+        """
+        Returns {document key: ids of conversations linked to any of its chunks}
+        """
+        key_filters = []
+        if any(key is not None for key in document_keys):
+            key_filters.append(
+                DocumentModel.document_key.in_(
+                    [key for key in document_keys if key is not None]
+                )
+            )
+        if None in document_keys:
+            key_filters.append(DocumentModel.document_key.is_(None))
+        if not key_filters:
+            return {}
+
+        rows = (
+            self.db.query(
+                DocumentModel.document_key, conversation_document.c.conversation_id
+            )
+            .join(
+                conversation_document,
+                conversation_document.c.document_id == DocumentModel.id,
+            )
+            .filter(or_(*key_filters))
+            .distinct()
+            .order_by(conversation_document.c.conversation_id)
+            .all()
+        )
+
+        conversation_ids = {}
+        for document_key, conversation_id in rows:
+            conversation_ids.setdefault(document_key, []).append(conversation_id)
+        return conversation_ids
+
     def get_documents_by_key(self, document_key):
         return (
             self.db.query(DocumentModel)
@@ -333,3 +1007,20 @@ class DocumentService:
     ):
         conversation.documents.remove(document)
         self.db.commit()
+
+
+async def sync_document_index():
+    """
+    Load the document index and index any stored chunks missing from it, e.g.
+    after the embedding model changed. Runs in the background on startup.
+    """
+    db = SessionLocal()
+    try:
+        # Loading the index can mean reading a large file, or asking the
+        # embedding provider for its dimension, so it's kept off the event loop
+        vector_index = await asyncio.to_thread(get_document_index)
+        await DocumentManager(db, vector_index=vector_index).index_unindexed_documents()
+    except Exception as e:
+        print(f"Couldn't index stored documents: {e}")
+    finally:
+        db.close()
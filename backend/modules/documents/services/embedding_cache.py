@@ -0,0 +1,96 @@
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from modules.llms.services.embedding_service import (
+    get_embedding_provider,
+    get_embeddings_batch,
+)
+from ..models import EmbeddingCacheModel
+
+# Keeps `IN (...)` queries below SQLite's bound parameter limit
+QUERY_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding store keyed by (chunk hash, model)
+    """
+
+    def __init__(self, db: Session, model: str = None):
+        self.db = db
+        self.model = model or get_embedding_provider().model_id
+
+    def get_many(self, chunk_hash_ids: List[str]) -> Dict[str, np.ndarray]:
+        cached = {}
+        chunk_hash_ids = list(chunk_hash_ids)
+
+        for i in range(0, len(chunk_hash_ids), QUERY_BATCH_SIZE):
+            rows = (
+                self.db.query(EmbeddingCacheModel)
+                .filter(
+                    EmbeddingCacheModel.model == self.model,
+                    EmbeddingCacheModel.chunk_hash_id.in_(
+                        chunk_hash_ids[i : i + QUERY_BATCH_SIZE]
+                    ),
+                )
+                .all()
+            )
+            for row in rows:
+                cached[row.chunk_hash_id] = np.frombuffer(
+                    row.embedding, dtype=np.float32
+                )
+
+        return cached
+
+    def put_many(self, embeddings: Dict[str, np.ndarray]):
+        """
+        Store {chunk_hash_id: embedding} for this model. Doesn't commit, the rows
+        are written in the caller's transaction, and discarded if it rolls back.
+        """
+        rows = []
+        for chunk_hash_id, embedding in embeddings.items():
+            embedding = np.asarray(embedding, dtype=np.float32)
+            rows.append(
+                {
+                    "chunk_hash_id": chunk_hash_id,
+                    "model": self.model,
+                    "dimension": embedding.shape[0],
+                    "embedding": embedding.tobytes(),
+                }
+            )
+
+        # Embeddings cached concurrently by another request are kept as they are
+        for i in range(0, len(rows), QUERY_BATCH_SIZE):
+            self.db.execute(
+                sqlite_insert(EmbeddingCacheModel)
+                .values(rows[i : i + QUERY_BATCH_SIZE])
+                .on_conflict_do_nothing(index_elements=["chunk_hash_id", "model"])
+            )
+
+    async def get_embeddings(self, chunks: Dict[str, str]) -> Dict[str, np.ndarray]:
+        """
+        Returns embeddings for {chunk_hash_id: text}, only embedding cache misses.
+        New embeddings are cached once the caller commits.
+        """
+        embeddings = self.get_many(chunks.keys())
+        missing = [
+            chunk_hash_id for chunk_hash_id in chunks if chunk_hash_id not in embeddings
+        ]
+
+        print(f"Embedding cache: {len(embeddings)} hits, {len(missing)} misses")
+
+        if missing:
+            new_embeddings = await get_embeddings_batch(
+                [chunks[chunk_hash_id] for chunk_hash_id in missing]
+            )
+            new_embeddings = {
+                chunk_hash_id: np.asarray(embedding, dtype=np.float32)
+                for chunk_hash_id, embedding in zip(missing, new_embeddings)
+            }
+            self.put_many(new_embeddings)
+            embeddings.update(new_embeddings)
+
+        return embeddings
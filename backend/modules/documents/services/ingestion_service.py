@@ -0,0 +1,196 @@
+import os
+import uuid
+import asyncio
+from typing import List
+
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, UploadFile
+
+from config import settings
+from database import SessionLocal
+from core.services.message_handler import MessageHandler
+from modules.messages.schemas import StatusMessage
+from ..models import IngestionJobModel
+from ..utils import READ_BLOCK_SIZE
+from .document_service import DocumentManager
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+uploads_path = os.path.join(current_path, "..", "..", "..", "data", "uploads")
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class IngestionService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    async def create_file_job(self, conversation_id: int, file: UploadFile):
+        """
+        Spool an upload to disk and create a job for it, so it can be processed
+        after the request has returned (or after a restart)
+        """
+        os.makedirs(uploads_path, exist_ok=True)
+        file_path = os.path.join(uploads_path, str(uuid.uuid4()))
+
+        with open(file_path, "wb") as spool_file:
+            while block := await file.read(READ_BLOCK_SIZE):
+                spool_file.write(block)
+
+        return self.create_job(
+            conversation_id=conversation_id,
+            source_type="file",
+            source=file.filename,
+            content_type=file.content_type,
+            file_path=file_path,
+        )
+
+    def create_url_job(self, conversation_id: int, url: str):
+        return self.create_job(
+            conversation_id=conversation_id, source_type="url", source=url
+        )
+
+    def create_job(self, **fields):
+        job = IngestionJobModel(**fields)
+        self.db.add(job)
+        self.db.commit()
+        return job
+
+    def get_job(self, job_id: int):
+        return (
+            self.db.query(IngestionJobModel)
+            .filter(IngestionJobModel.id == job_id)
+            .first()
+        )
+
+    def get_jobs_by_conversation(self, conversation_id: int):
+        return (
+            self.db.query(IngestionJobModel)
+            .filter(IngestionJobModel.conversation_id == conversation_id)
+            .order_by(IngestionJobModel.id.desc())
+            .all()
+        )
+
+    def get_unfinished_jobs(self) -> List[IngestionJobModel]:
+        return (
+            self.db.query(IngestionJobModel)
+            .filter(IngestionJobModel.status.notin_(FINISHED_STATUSES))
+            .order_by(IngestionJobModel.id)
+            .all()
+        )
+
+    def update_job(self, job: IngestionJobModel, **fields):
+        for key, value in fields.items():
+            setattr(job, key, value)
+        self.db.commit()
+        return job
+
+
+class IngestionQueue:
+    """
+    Processes ingestion jobs in the background on a bounded pool of workers.
+
+    Jobs are persisted, so any left unfinished by a restart are queued again on
+    startup. A resumed job parses its source again from the start, chunks saved
+    before the restart are recognised by their hash and aren't embedded again.
+    Every chunk gets the job's document key, so the source stays one document.
+    """
+
+    def __init__(self):
+        self.queue = None
+        self.workers = []
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+
+        db = SessionLocal()
+        try:
+            for job in IngestionService(db).get_unfinished_jobs():
+                print(f"Resuming ingestion job {job.id} ({job.source})..")
+                self.queue.put_nowait(job.id)
+        finally:
+            db.close()
+
+        max_workers = settings.get("documents", {}).get("ingest_max_workers", 2)
+        self.workers = [asyncio.create_task(self.work()) for _ in range(max_workers)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def enqueue(self, job: IngestionJobModel):
+        self.queue.put_nowait(job.id)
+
+    async def work(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self.run_job(job_id)
+            except Exception as e:
+                print(f"Ingestion job {job_id} crashed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run_job(self, job_id: int):
+        db = SessionLocal()
+        try:
+            ingestion_service = IngestionService(db)
+            job = ingestion_service.get_job(job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return
+
+            ingestion_service.update_job(
+                job, status="running", pages_parsed=0, chunks_embedded=0
+            )
+            await self.send_status(db, job)
+
+            async def progress(pages_parsed, chunks_embedded):
+                ingestion_service.update_job(
+                    job, pages_parsed=pages_parsed, chunks_embedded=chunks_embedded
+                )
+                await self.send_status(db, job)
+
+            document_manager = DocumentManager(db, job.conversation_id)
+            try:
+                if job.source_type == "url":
+                    await document_manager.load_url(
+                        job.source, progress=progress, document_key=job.document_key
+                    )
+                else:
+                    with open(job.file_path, "rb") as spool_file:
+                        file = UploadFile(
+                            spool_file,
+                            filename=job.source,
+                            headers=Headers({"content-type": job.content_type or ""}),
+                        )
+                        await document_manager.load_files(
+                            [file], progress=progress, document_key=job.document_key
+                        )
+
+                ingestion_service.update_job(job, status="completed")
+            except Exception as e:
+                print(f"Ingestion job {job.id} failed: {e}")
+                db.rollback()
+                ingestion_service.update_job(job, status="failed", error=str(e))
+
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+            await self.send_status(db, job)
+        finally:
+            db.close()
+
+    async def send_status(self, db: Session, job: IngestionJobModel):
+        message = StatusMessage(
+            content={"ingestion_job": job.serialize()},
+            conversation_id=job.conversation_id,
+        )
+        try:
+            await MessageHandler(db=db).send_status_to_ui(message)
+        except Exception as e:
+            # A closed websocket shouldn't fail the job
+            print(f"Couldn't send ingestion job status: {e}")
+
+
+ingestion_queue = IngestionQueue()
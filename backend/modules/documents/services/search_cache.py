@@ -0,0 +1,89 @@
+import time
+import threading
+from collections import OrderedDict
+
+from config import settings
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire `ttl` seconds after being stored
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            return entry[0] if entry else None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split())
+
+
+class SearchCache:
+    """
+    Caches query embeddings and document search results, so regenerations and
+    tool follow-ups on the same user message don't embed and search again.
+
+    Results are keyed by a generation that's bumped whenever documents are
+    ingested, linked or deleted, so a stale result is never served. A search
+    still running when the generation changes stores its result under the old
+    one, where nothing looks it up. Changes made by other worker processes are
+    picked up through the index's own generation, or at the latest after `ttl`.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self.embeddings = TTLCache(max_size, ttl)
+        self.results = TTLCache(max_size, ttl)
+        self.generation = 0
+
+    def invalidate(self):
+        self.generation += 1
+        self.results.clear()
+
+    def embedding_key(self, text: str, model: str):
+        return (model, normalize_query(text))
+
+    def results_key(self, text: str, scope: tuple, index_generation):
+        return (normalize_query(text), scope, self.generation, index_generation)
+
+
+document_settings = settings.get("documents", {})
+search_cache = SearchCache(
+    max_size=document_settings.get("search_cache_size", 256),
+    ttl=document_settings.get("search_cache_ttl", 300),
+)
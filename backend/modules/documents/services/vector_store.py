@@ -0,0 +1,1044 @@
+import os
+import json
+import shutil
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+import numpy as np
+import faiss
+
+from config import settings
+from modules.llms.services.embedding_service import (
+    DEFAULT_EMBEDDING_MODEL,
+    get_embedding_provider,
+)
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(current_path, "..", "..", "..", "data")
+
+
+class ReadWriteLock:
+    """
+    Allows any number of concurrent readers, or a single writer
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+# Index types selectable via `index_type` in the [documents] settings
+INDEX_FACTORY_STRINGS = {
+    "Flat": "Flat",
+    "SQ8": "SQ8",
+    "PQ": "PQ{pq_m}",
+    "IVFFlat": "IVF{nlist},Flat",
+    "IVFSQ8": "IVF{nlist},SQ8",
+    "IVFPQ": "IVF{nlist},PQ{pq_m}",
+    "HNSW": "HNSW{hnsw_m}",
+}
+
+INDEX_CLASSES = {
+    "Flat": faiss.IndexFlat,
+    "SQ8": faiss.IndexScalarQuantizer,
+    "PQ": faiss.IndexPQ,
+    "IVFFlat": faiss.IndexIVFFlat,
+    "IVFSQ8": faiss.IndexIVFScalarQuantizer,
+    "IVFPQ": faiss.IndexIVFPQ,
+    "HNSW": faiss.IndexHNSW,
+}
+
+# Index types storing compressed codes instead of float vectors, their
+# distances are approximate and benefit from exact re-ranking
+QUANTIZED_INDEX_TYPES = {"SQ8", "PQ", "IVFSQ8", "IVFPQ"}
+
+DEFAULT_INDEX_SETTINGS = {
+    "index_type": "Flat",
+    "nlist": 1024,
+    "pq_m": 64,
+    "hnsw_m": 32,
+    "nprobe": 16,
+    "ef_search": 64,
+    "train_min_vectors": 0,
+    "merge_max_segments": 8,
+    "merge_max_delta_vectors": 50000,
+    "mmap": False,
+    "rerank_factor": 0,
+}
+
+
+def _atomic_write(path: str, write):
+    """
+    Calls `write(temp_path)`, then moves the finished file into place
+    """
+    temp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    try:
+        write(temp_path)
+        with open(temp_path, "rb+") as temp_file:
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _read_index_mmap(path: str):
+    """
+    Read an index without copying its vectors onto the heap, so worker processes
+    share the OS page cache. The returned index is read-only.
+    """
+    flag_options = []
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        # Newer FAISS versions can also map flat codes, not just IVF lists
+        flag_options.append(faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    flag_options.append(faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+    for flags in flag_options[:-1]:
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path, flag_options[-1])
+
+
+def _get_index_vectors(index):
+    """
+    Returns all (ids, vectors) stored in an ID-mapped index
+    """
+    inner_index = faiss.downcast_index(index.index)
+    if isinstance(inner_index, faiss.IndexIVF):
+        inner_index.make_direct_map()
+    vectors = inner_index.reconstruct_n(0, inner_index.ntotal)
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    return ids, vectors
+
+
+class VectorIndex:
+    """
+    Process-wide handle to a segmented FAISS index persisted on disk.
+
+    On disk an index is a directory holding an immutable base segment, small
+    delta segments with the vectors added since the base was written, and
+    tombstone segments listing deleted ids. `manifest.json` names the live
+    segments and is replaced atomically, so writes are proportional to the new
+    data and a crash mid-write never corrupts the index. Deltas and tombstones
+    are folded into a new base by a background merge.
+
+    The index is read once and shared by every DocumentManager, and only
+    picks up new segments when the manifest changes on disk (e.g. another
+    worker wrote to it). With `mmap` enabled the base segment is memory-mapped
+    read-only instead of loaded onto the heap.
+
+    Quantized index types (SQ8, PQ, IVFSQ8, IVFPQ) store 8-bit or product
+    quantized codes instead of float32 vectors, cutting memory 4x to ~100x.
+
+    The manifest records the embedding model and dimension. If they don't match
+    the configured ones the stored vectors are useless, so the index loads
+    empty with `model_changed` set, until `reset` replaces it.
+
+    `vector_source(ids)`, if given, returns {id: vector} of the full precision
+    vectors it has for the given ids. Merges rebuild quantized indexes from
+    those instead of re-quantizing vectors decoded from the old base.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dimension: int = 1536,
+        index_settings: dict = None,
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        vector_source: Callable[[np.ndarray], Dict[int, np.ndarray]] = None,
+    ):
+        self.path = path
+        self.vector_source = vector_source
+        self.manifest_path = os.path.join(path, "manifest.json")
+        self.dimension = dimension
+        self.model = model
+        self.index_settings = {**DEFAULT_INDEX_SETTINGS, **(index_settings or {})}
+        self.index_type = self.index_settings["index_type"]
+        self.lock = ReadWriteLock()
+        # Held while a merge or compaction replaces the base segment
+        self.maintenance_lock = threading.Lock()
+        self.manifest = None
+        self.file_generation = None
+        self.merge_thread = None
+
+        # Base segment, plus an in-memory flat index holding every delta segment
+        self.index = None
+        self.base_ids = np.empty(0, dtype=np.int64)
+        self.delta_index = None
+        self.delta_ids = np.empty(0, dtype=np.int64)
+        self.tombstones = set()
+        self.loaded_segments = set()
+        self.is_positional = False
+        self.model_changed = False
+
+        if self.index_type not in INDEX_FACTORY_STRINGS:
+            raise ValueError(f"Unknown index type: {self.index_type}")
+
+        os.makedirs(self.path, exist_ok=True)
+        self.load()
+
+    """
+    Persistence
+    """
+
+    def _get_file_generation(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @contextmanager
+    def _file_lock(self):
+        # Serializes manifest updates across worker processes
+        with open(os.path.join(self.path, ".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: dict):
+        def write(temp_path):
+            with open(temp_path, "w") as f:
+                json.dump(manifest, f)
+
+        _atomic_write(self.manifest_path, write)
+
+    def _write_segment(self, prefix: str, write, extension=".faiss"):
+        name = f"{prefix}-{uuid.uuid4().hex}{extension}"
+        _atomic_write(os.path.join(self.path, name), write)
+        return name
+
+    def _remove_segments(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+
+    def load(self):
+        with self.lock.write():
+            with self._file_lock():
+                manifest = self._read_manifest()
+                if manifest is None:
+                    manifest = self._initialize()
+
+            if self._matches_model(manifest):
+                self._load_manifest(manifest)
+            else:
+                print(
+                    f"Index {self.path} holds {manifest.get('model')} embeddings, "
+                    f"{self.model} is configured. It needs to be rebuilt."
+                )
+                self.model_changed = True
+                self._load_empty(manifest)
+
+        if not self.model_changed and self._needs_merge():
+            self.schedule_merge()
+
+    def _matches_model(self, manifest: dict):
+        return (
+            manifest.get("model", DEFAULT_EMBEDDING_MODEL) == self.model
+            and manifest["dimension"] == self.dimension
+        )
+
+    def _initialize(self):
+        # Indexes saved before segments existed are a single `<name>.bin` file
+        legacy_path = f"{self.path}.bin"
+
+        if os.path.exists(legacy_path):
+            print(f"Converting {legacy_path} to a segmented index..")
+            base = faiss.read_index(legacy_path)
+            # Created before embedding models were configurable
+            model, dimension = DEFAULT_EMBEDDING_MODEL, base.d
+        else:
+            base = self._create_index()
+            model, dimension = self.model, self.dimension
+
+        manifest = {
+            "base": self._write_segment(
+                "base", lambda temp_path: faiss.write_index(base, temp_path)
+            ),
+            "deltas": [],
+            "tombstones": [],
+            "dimension": dimension,
+            "model": model,
+        }
+        self._write_manifest(manifest)
+
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+        return manifest
+
+    def _load_manifest(self, manifest: dict):
+        """
+        Bring the in-memory index up to date with `manifest`, only reading
+        segments we haven't loaded yet
+        """
+        if self.manifest is None or manifest["base"] != self.manifest["base"]:
+            self._set_base(self._read_base(manifest["base"]))
+            self._clear_segments()
+
+        new_delta_ids = []
+        for name in manifest["deltas"]:
+            if name not in self.loaded_segments:
+                delta = faiss.read_index(os.path.join(self.path, name))
+                ids, vectors = _get_index_vectors(delta)
+                self.delta_index.add_with_ids(vectors, ids)
+                new_delta_ids.append(ids)
+                self.loaded_segments.add(name)
+
+        if new_delta_ids:
+            self.delta_ids = np.sort(np.concatenate([self.delta_ids, *new_delta_ids]))
+
+        for name in manifest["tombstones"]:
+            if name not in self.loaded_segments:
+                ids = np.load(os.path.join(self.path, name))
+                self.tombstones.update(int(id) for id in ids)
+                self.loaded_segments.add(name)
+
+        self.manifest = manifest
+        self.file_generation = self._get_file_generation()
+
+    def _clear_segments(self):
+        self.delta_index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+        self.delta_ids = np.empty(0, dtype=np.int64)
+        self.tombstones = set()
+        self.loaded_segments = set()
+
+    def _load_empty(self, manifest: dict):
+        # Stand-in state for an index built with another model, nothing is read
+        self._set_base(self._create_index())
+        self._clear_segments()
+        self.manifest = manifest
+        self.file_generation = self._get_file_generation()
+
+    def reset(self):
+        """
+        Replace the index with an empty one for the configured embedding model,
+        its vectors have to be added again
+        """
+        with self.lock.write():
+            with self._file_lock():
+                manifest = self._read_manifest()
+
+                # Another worker may have reset the index already
+                if not self._matches_model(manifest):
+                    print(f"Resetting {self.path} for {self.model} embeddings..")
+                    old_segments = [manifest["base"]]
+                    old_segments += manifest["deltas"] + manifest["tombstones"]
+
+                    base = self._create_index()
+                    manifest = {
+                        "base": self._write_segment(
+                            "base",
+                            lambda temp_path: faiss.write_index(base, temp_path),
+                        ),
+                        "deltas": [],
+                        "tombstones": [],
+                        "dimension": self.dimension,
+                        "model": self.model,
+                    }
+                    self._write_manifest(manifest)
+                    self._remove_segments(old_segments)
+
+            self.manifest = None
+            self._load_manifest(manifest)
+            self.model_changed = False
+
+    def _commit_segments(self, deltas=(), tombstones=()):
+        """
+        Add newly written segments to the manifest and load them
+        """
+        with self._file_lock():
+            manifest = self._read_manifest()
+            manifest = {
+                **manifest,
+                "deltas": manifest["deltas"] + list(deltas),
+                "tombstones": manifest["tombstones"] + list(tombstones),
+            }
+            self._write_manifest(manifest)
+            self._load_manifest(manifest)
+
+    def _read_base(self, name: str):
+        path = os.path.join(self.path, name)
+        if self.index_settings["mmap"]:
+            return _read_index_mmap(path)
+        return faiss.read_index(path)
+
+    def _replace_base(self):
+        """
+        Persist the in-memory base as a new base segment, replacing every
+        existing segment. Expects deltas and tombstones to be folded in already.
+        """
+        with self._file_lock():
+            old_segments = [self.manifest["base"]]
+            old_segments += self.manifest["deltas"] + self.manifest["tombstones"]
+
+            base = self.index
+            manifest = {
+                **self.manifest,
+                "base": self._write_segment(
+                    "base", lambda temp_path: faiss.write_index(base, temp_path)
+                ),
+                "deltas": [],
+                "tombstones": [],
+            }
+            self._write_manifest(manifest)
+
+            self._clear_segments()
+            self.manifest = manifest
+            self.file_generation = self._get_file_generation()
+
+            # Swap the freshly built heap copy for a mapping of the file just written
+            if self.index_settings["mmap"]:
+                self._set_base(self._read_base(manifest["base"]))
+
+            self._remove_segments(old_segments)
+
+    def reload_if_changed(self):
+        if self._get_file_generation() != self.file_generation:
+            with self.lock.write():
+                with self._file_lock():
+                    manifest = self._read_manifest()
+                if self._matches_model(manifest):
+                    self._load_manifest(manifest)
+                    self.model_changed = False
+
+    """
+    Index construction & training
+    """
+
+    @property
+    def requires_training(self):
+        return self.index_type not in ("Flat", "HNSW")
+
+    @property
+    def is_quantized(self):
+        return self.index_type in QUANTIZED_INDEX_TYPES
+
+    @property
+    def train_threshold(self):
+        threshold = self.index_settings["train_min_vectors"]
+        # FAISS wants at least ~39 training points per IVF cluster / PQ centroid
+        if self.index_type.startswith("IVF"):
+            threshold = max(threshold, 39 * self.index_settings["nlist"])
+        if self.index_type.endswith("PQ"):
+            threshold = max(threshold, 39 * 256)
+        # Scalar quantizers learn per-dimension ranges, a few vectors won't do
+        if self.index_type.endswith("SQ8"):
+            threshold = max(threshold, 1000)
+        return threshold
+
+    @property
+    def inner_index(self):
+        # The index doing the actual vector search, beneath the ID mapping
+        if isinstance(self.index, faiss.IndexIDMap):
+            return faiss.downcast_index(self.index.index)
+        return self.index
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal + self.delta_index.ntotal - len(self.tombstones)
+
+    @property
+    def generation(self):
+        # Changes whenever any process writes to the index
+        return self._get_file_generation()
+
+    def _set_base(self, index):
+        self.index = index
+        self.is_positional = not isinstance(index, faiss.IndexIDMap)
+        if self.is_positional:
+            self.base_ids = np.arange(index.ntotal, dtype=np.int64)
+        else:
+            self.base_ids = np.sort(faiss.vector_to_array(index.id_map))
+        self._apply_search_parameters()
+
+    def _create_index(self):
+        # Indexes that need training start out flat until we have enough vectors
+        if self.requires_training:
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+
+        return self._create_target_index()
+
+    def _create_target_index(self):
+        factory_string = INDEX_FACTORY_STRINGS[self.index_type].format(
+            **self.index_settings
+        )
+        return faiss.index_factory(
+            self.dimension, f"IDMap2,{factory_string}", faiss.METRIC_L2
+        )
+
+    def _needs_build(self):
+        if isinstance(self.inner_index, INDEX_CLASSES[self.index_type]):
+            return False
+        if self.requires_training:
+            return self.ntotal >= self.train_threshold
+        return True
+
+    def _get_vectors(self):
+        """
+        Returns all live (ids, vectors) across every segment
+        """
+        if self.is_positional:
+            ids = self.base_ids
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        else:
+            ids, vectors = _get_index_vectors(self.index)
+
+        delta_ids, delta_vectors = _get_index_vectors(self.delta_index)
+        ids = np.concatenate([ids, delta_ids])
+        vectors = np.concatenate([vectors, delta_vectors])
+
+        if self.tombstones:
+            live = ~np.isin(ids, np.array(list(self.tombstones), dtype=np.int64))
+            ids, vectors = ids[live], vectors[live]
+
+        return ids, vectors
+
+    def _build_index(self, ids, vectors):
+        self._set_base(self._create_built_index(ids, vectors))
+
+    def _create_built_index(self, ids, vectors):
+        """
+        Build a base index of the configured type from the given vectors
+        """
+        if self.requires_training and len(ids) < self.train_threshold:
+            print(f"Building flat index from {len(ids)} vectors..")
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+        else:
+            print(f"Building {self.index_type} index from {len(ids)} vectors..")
+            index = self._create_target_index()
+
+        if not index.is_trained:
+            # Train on a sample, training cost grows with the number of vectors
+            max_training_vectors = 256 * max(self.index_settings["nlist"], 256)
+            if len(vectors) > max_training_vectors:
+                sample = np.random.default_rng(0).choice(
+                    len(vectors), max_training_vectors, replace=False
+                )
+                index.train(vectors[sample])
+            else:
+                index.train(vectors)
+
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+
+        return index
+
+    def _apply_search_parameters(self):
+        parameters = faiss.ParameterSpace()
+        if isinstance(self.inner_index, faiss.IndexIVF):
+            parameters.set_index_parameter(
+                self.index, "nprobe", self.index_settings["nprobe"]
+            )
+        elif isinstance(self.inner_index, faiss.IndexHNSW):
+            parameters.set_index_parameter(
+                self.index, "efSearch", self.index_settings["ef_search"]
+            )
+
+    def get_vectors(self):
+        """
+        Returns all live (ids, vectors), as reconstructed from the index
+        """
+        self.reload_if_changed()
+        with self.lock.read():
+            return self._get_vectors()
+
+    def build(self, ids: np.ndarray, vectors: np.ndarray):
+        """
+        Replace the contents of the index with the given vectors
+        """
+        with self.lock.write():
+            self._build_index(np.asarray(ids, dtype=np.int64), vectors)
+            self._replace_base()
+
+    def assign_ids(self, position_ids: dict):
+        """
+        Convert a legacy positional index to one keyed by stable ids.
+
+        Takes {position: id}, vectors without an entry are dropped.
+        """
+        with self.lock.write():
+            if not self.is_positional:
+                return
+
+            positions, vectors = self._get_vectors()
+            keep = np.array(
+                [int(position) in position_ids for position in positions], dtype=bool
+            )
+            ids = np.array(
+                [position_ids[int(position)] for position in positions[keep]],
+                dtype=np.int64,
+            )
+            self._build_index(ids, vectors[keep])
+            self._replace_base()
+
+    """
+    Merging
+    """
+
+    def _needs_merge(self):
+        if self.is_positional:
+            return False
+        segment_count = len(self.manifest["deltas"]) + len(self.manifest["tombstones"])
+        return (
+            segment_count >= self.index_settings["merge_max_segments"]
+            or self.delta_index.ntotal >= self.index_settings["merge_max_delta_vectors"]
+            or self._needs_build()
+        )
+
+    def schedule_merge(self):
+        """
+        Merge segments in a background thread, unless a merge is already running
+        """
+        if self.merge_thread and self.merge_thread.is_alive():
+            return
+        self.merge_thread = threading.Thread(target=self.merge, daemon=True)
+        self.merge_thread.start()
+
+    def merge(self):
+        """
+        Fold deltas and tombstones into a new base segment.
+
+        The new base is built from a snapshot while searches and writes go on,
+        and swapped in like `compact` does. Segments committed meanwhile, by
+        this or another worker, are kept on top of it.
+        """
+        with self.maintenance_lock:
+            self.reload_if_changed()
+            with self.lock.read():
+                if not self._needs_merge_work():
+                    return
+                snapshot = self.manifest
+                print(
+                    f"Merging {len(snapshot['deltas'])} delta and "
+                    f"{len(snapshot['tombstones'])} tombstone segments.."
+                )
+                update_in_place = self._can_update_in_place()
+                if update_in_place:
+                    base = faiss.clone_index(self.index)
+                    delta_ids, delta_vectors = _get_index_vectors(self.delta_index)
+                    tombstones = np.array(list(self.tombstones), dtype=np.int64)
+                else:
+                    ids, vectors = self._get_vectors()
+
+            if update_in_place:
+                if len(delta_ids):
+                    base.add_with_ids(delta_vectors, delta_ids)
+                if len(tombstones):
+                    base.remove_ids(tombstones)
+            else:
+                vectors = self._get_source_vectors(ids, vectors)
+                base = self._create_built_index(ids, vectors)
+
+            if not self._swap_base(snapshot, base):
+                print("Index was merged by another worker, discarding our merge")
+
+    def _get_source_vectors(self, ids, vectors):
+        """
+        Replace vectors decoded from a quantized index with the full precision
+        ones from `vector_source`, where it has them
+        """
+        if not self.is_quantized or self.vector_source is None or not len(ids):
+            return vectors
+
+        stored = self.vector_source(ids)
+        if not stored:
+            return vectors
+
+        vectors = vectors.copy()
+        for position, id in enumerate(ids.tolist()):
+            if id in stored:
+                vectors[position] = stored[id]
+        print(f"Rebuilding from {len(stored)} of {len(ids)} full precision vectors")
+        return vectors
+
+    def _needs_merge_work(self):
+        if self.is_positional:
+            return False
+        if self.manifest["deltas"] or self.manifest["tombstones"]:
+            return True
+        return self._needs_build()
+
+    def _can_update_in_place(self):
+        inner_index = self.inner_index
+        return (
+            # Mapped bases are read-only, they're always rebuilt
+            not self.index_settings["mmap"]
+            and isinstance(inner_index, INDEX_CLASSES[self.index_type])
+            # HNSW can't remove vectors, and IVF lists keep the positions the
+            # ID map compacts on removal, so deletes force a rebuild for both
+            and (
+                not self.tombstones
+                or not isinstance(inner_index, (faiss.IndexHNSW, faiss.IndexIVF))
+            )
+        )
+
+    def _swap_base(self, snapshot: dict, index) -> bool:
+        """
+        Replace the base and the segments of `snapshot` with `index`, keeping
+        segments committed since the snapshot was taken. Returns False, and
+        leaves the index as it is, if another worker replaced the base first.
+        """
+        name = self._write_segment(
+            "base", lambda temp_path: faiss.write_index(index, temp_path)
+        )
+
+        self.reload_if_changed()
+        with self.lock.write():
+            with self._file_lock():
+                manifest = self._read_manifest()
+                if manifest["base"] != snapshot["base"]:
+                    self._remove_segments([name])
+                    return False
+
+                old_segments = [snapshot["base"]]
+                old_segments += snapshot["deltas"] + snapshot["tombstones"]
+                manifest = {
+                    **manifest,
+                    "base": name,
+                    "deltas": [
+                        delta
+                        for delta in manifest["deltas"]
+                        if delta not in snapshot["deltas"]
+                    ],
+                    "tombstones": [
+                        tombstones
+                        for tombstones in manifest["tombstones"]
+                        if tombstones not in snapshot["tombstones"]
+                    ],
+                }
+                self._write_manifest(manifest)
+
+                if self.index_settings["mmap"]:
+                    index = self._read_base(name)
+                self._set_base(index)
+                self._clear_segments()
+                self.manifest = {**manifest, "deltas": [], "tombstones": []}
+                self._load_manifest(manifest)
+
+                self._remove_segments(old_segments)
+
+        return True
+
+    """
+    Compaction
+    """
+
+    def compact(self, select):
+        """
+        Rebuild the base segment from a snapshot of the live vectors, dropping
+        dead ones, and swap it in atomically.
+
+        `select(ids, vectors)` returns the (ids, vectors) to keep. It's called
+        while writes are held off, so the snapshot can be compared with the
+        database consistently. Searches run on the old segments throughout,
+        and segments written while the new base is built are kept on top of it.
+        """
+        with self.maintenance_lock:
+            self.reload_if_changed()
+            with self.lock.read():
+                snapshot = self.manifest
+                ids, vectors = select(*self._get_vectors())
+
+            index = self._create_built_index(np.asarray(ids, dtype=np.int64), vectors)
+            if not self._swap_base(snapshot, index):
+                # Another worker merged, our snapshot is stale
+                raise Exception("Index was merged while compacting, try again")
+
+            return self.ntotal
+
+    """
+    Reads & writes
+    """
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        k: int,
+        allowed_ids: np.ndarray = None,
+        before_id: int = None,
+    ):
+        """
+        Search every segment, optionally restricted to `allowed_ids` and/or ids
+        below `before_id` inside the search itself, so a narrow scope still
+        returns up to `k` results
+        """
+        self.reload_if_changed()
+        with self.lock.read():
+            tombstones = np.array(sorted(self.tombstones), dtype=np.int64)
+
+            if allowed_ids is not None:
+                allowed_ids = np.setdiff1d(
+                    np.asarray(allowed_ids, dtype=np.int64), tombstones
+                )
+                if before_id is not None:
+                    allowed_ids = allowed_ids[allowed_ids < before_id]
+                selector = faiss.IDSelectorBatch(allowed_ids)
+                k = min(k, len(allowed_ids))
+            elif len(tombstones):
+                tombstone_selector = faiss.IDSelectorBatch(tombstones)
+                selector = faiss.IDSelectorNot(tombstone_selector)
+            else:
+                selector = None
+
+            if allowed_ids is None and before_id is not None:
+                # The selectors it combines must outlive it
+                range_selector = faiss.IDSelectorRange(0, before_id)
+                scope_selector = selector
+                if scope_selector is None:
+                    selector = range_selector
+                else:
+                    selector = faiss.IDSelectorAnd(range_selector, scope_selector)
+
+            results = []
+            for index, segment_ids in (
+                (self.index, self.base_ids),
+                (self.delta_index, self.delta_ids),
+            ):
+                if allowed_ids is not None:
+                    # Vectors of this segment that are in scope
+                    in_segment = np.searchsorted(segment_ids, allowed_ids)
+                    in_segment = in_segment[in_segment < len(segment_ids)]
+                    candidates = int(
+                        np.count_nonzero(np.isin(segment_ids[in_segment], allowed_ids))
+                    )
+                elif before_id is not None:
+                    candidates = int(np.count_nonzero(segment_ids < before_id))
+                else:
+                    candidates = index.ntotal
+
+                if candidates:
+                    results.append(
+                        self._search_segment(
+                            index, vectors, min(k, candidates), selector
+                        )
+                    )
+
+            return self._merge_results(results, len(vectors), k)
+
+    def _search_segment(self, index, vectors, k, selector):
+        if selector is None:
+            return index.search(vectors, k)
+
+        inner_index = faiss.downcast_index(index.index)
+        if isinstance(inner_index, faiss.IndexPQ):
+            return self._search_post_filtered(index, vectors, k, selector)
+
+        nprobe = self.index_settings["nprobe"]
+        ef_search = max(self.index_settings["ef_search"], k)
+
+        while True:
+            if isinstance(inner_index, faiss.IndexIVF):
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+            elif isinstance(inner_index, faiss.IndexHNSW):
+                params = faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+            else:
+                params = faiss.SearchParameters(sel=selector)
+
+            distances, ids = index.search(vectors, k, params=params)
+
+            # Approximate indexes can miss scoped vectors, so widen the search
+            # until every query gets k results or the whole index was visited
+            if (ids != -1).all():
+                break
+            if isinstance(inner_index, faiss.IndexIVF) and nprobe < inner_index.nlist:
+                nprobe = min(nprobe * 4, inner_index.nlist)
+            elif (
+                isinstance(inner_index, faiss.IndexHNSW)
+                and ef_search < inner_index.ntotal
+            ):
+                ef_search = min(ef_search * 4, inner_index.ntotal)
+            else:
+                break
+
+        return distances, ids
+
+    def _search_post_filtered(self, index, vectors, k, selector):
+        """
+        Search for more results than needed and drop those rejected by
+        `selector`, for index types that don't accept one (IndexPQ)
+        """
+        fetch_k = k
+        while True:
+            fetch_k = min(fetch_k * 4, index.ntotal)
+            candidate_distances, candidate_ids = index.search(vectors, fetch_k)
+
+            distances = np.full((len(vectors), k), np.inf, dtype=np.float32)
+            ids = np.full((len(vectors), k), -1, dtype=np.int64)
+            for row, row_ids in enumerate(candidate_ids):
+                keep = [
+                    column
+                    for column, id in enumerate(row_ids)
+                    if id != -1 and selector.is_member(int(id))
+                ][:k]
+                distances[row, : len(keep)] = candidate_distances[row, keep]
+                ids[row, : len(keep)] = row_ids[keep]
+
+            if (ids != -1).all() or fetch_k >= index.ntotal:
+                return distances, ids
+
+    def _merge_results(self, results, query_count, k):
+        """
+        Combine per-segment results into a single top-k, padded with -1 like FAISS
+        """
+        distances = np.full((query_count, k), np.inf, dtype=np.float32)
+        ids = np.full((query_count, k), -1, dtype=np.int64)
+
+        if not results:
+            return distances, ids
+
+        all_distances = np.concatenate([result[0] for result in results], axis=1)
+        all_ids = np.concatenate([result[1] for result in results], axis=1)
+        all_distances[all_ids == -1] = np.inf
+
+        order = np.argsort(all_distances, axis=1)[:, :k]
+        count = order.shape[1]
+        distances[:, :count] = np.take_along_axis(all_distances, order, axis=1)
+        ids[:, :count] = np.take_along_axis(all_ids, order, axis=1)
+        ids[np.isinf(distances)] = -1
+
+        return distances, ids
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        """
+        Add vectors under the given ids, persisted as a new delta segment
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        self.reload_if_changed()
+        if self.tombstones.intersection(ids.tolist()):
+            # Reused ids must not be hidden by an older tombstone. Document ids
+            # are never reused, this is only for ids freed before that
+            self.merge()
+
+        with self.lock.write():
+            delta = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+            delta.add_with_ids(vectors, ids)
+            name = self._write_segment(
+                "delta", lambda temp_path: faiss.write_index(delta, temp_path)
+            )
+            self._commit_segments(deltas=[name])
+
+        if self._needs_merge():
+            self.schedule_merge()
+
+    def remove(self, ids: np.ndarray):
+        """
+        Remove vectors by id, persisted as a new tombstone segment
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+
+        def write(temp_path):
+            with open(temp_path, "wb") as f:
+                np.save(f, ids)
+
+        self.reload_if_changed()
+        with self.lock.write():
+            name = self._write_segment("tombstones", write, extension=".npy")
+            self._commit_segments(tombstones=[name])
+
+        if self._needs_merge():
+            self.schedule_merge()
+
+
+_indexes = {}
+_registry_lock = threading.Lock()
+
+
+def get_vector_index(
+    name: str = "faiss_index",
+    index_settings: dict = None,
+    vector_source: Callable[[np.ndarray], Dict[int, np.ndarray]] = None,
+) -> VectorIndex:
+    """
+    Returns the shared index with the given name, loading it on first use.
+    Unless `index_settings` are given, the [documents] index settings are used.
+    `vector_source` is only used when the index is loaded.
+    """
+    with _registry_lock:
+        if name not in _indexes:
+            _indexes[name] = create_vector_index(name, index_settings, vector_source)
+        return _indexes[name]
+
+
+def create_vector_index(
+    name: str,
+    index_settings: dict = None,
+    vector_source: Callable[[np.ndarray], Dict[int, np.ndarray]] = None,
+) -> VectorIndex:
+    """
+    Load the index with the given name, for callers that manage its lifetime
+    themselves instead of sharing it through `get_vector_index`
+    """
+    if index_settings is None:
+        index_settings = {
+            key: value
+            for key, value in settings.get("documents", {}).items()
+            if key in DEFAULT_INDEX_SETTINGS
+        }
+    provider = get_embedding_provider()
+    return VectorIndex(
+        os.path.join(data_path, name),
+        dimension=provider.dimension,
+        index_settings=index_settings,
+        model=provider.model_id,
+        vector_source=vector_source,
+    )
+
+
+def delete_vector_index(name: str):
+    """
+    Delete the index with the given name from disk
+    """
+    with _registry_lock:
+        _indexes.pop(name, None)
+        shutil.rmtree(os.path.join(data_path, name), ignore_errors=True)
@@ -1,67 +1,191 @@
 import os
+import codecs
+import asyncio
 import tempfile
 import uuid
-from langchain.document_loaders import PyPDFLoader
+from collections import deque
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain.docstore.document import Document
 from langchain.document_loaders import UnstructuredURLLoader
 
+from config import settings
+from .parsing import count_pdf_pages, extract_pdf_pages
 
-def _get_temp_file(file_content):
-    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-        temp_file.write(file_content)
-        temp_file.flush()
+# Uploads are read, and large text files yielded, in blocks of this size
+READ_BLOCK_SIZE = 1024 * 1024
 
-        return temp_file.name
+# PDF pages extracted per task sent to the parse pool
+PDF_PAGES_PER_TASK = 8
 
+PARSE_MAX_WORKERS = (
+    settings.get("documents", {}).get("parse_max_workers") or os.cpu_count() or 1
+)
 
-async def pdf_loader(files):
-    documents = []
+_parse_pool = None
 
-    for file in files:
-        file_path = _get_temp_file(await file.read())
-        loader = PyPDFLoader(file_path)
-        file_docs = loader.load()
-        document_key = str(uuid.uuid4())
 
-        for doc in file_docs:
-            doc.metadata["document_type"] = "pdf"
-            doc.metadata["source"] = file.filename
-            doc.metadata["document_key"] = document_key
+def run_in_parse_pool(function, *args):
+    """
+    Run a CPU-bound parsing function in a worker process, so it doesn't block
+    the event loop. Returns an awaitable future.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        # Forking a process running threads (uvicorn, index merges) isn't safe
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=PARSE_MAX_WORKERS, mp_context=get_context("spawn")
+        )
+    return asyncio.get_running_loop().run_in_executor(_parse_pool, function, *args)
 
-        documents += file_docs
 
-        os.remove(file_path)
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(cancel_futures=True)
+        _parse_pool = None
 
-    return documents
 
+class PrefetchedDocuments:
+    """
+    Consumes a document generator in the background, so a file keeps being
+    parsed while earlier files are saved. Buffers at most `max_pending` documents.
+    """
+
+    _done = object()
+
+    def __init__(self, documents, max_pending=8):
+        self.queue = asyncio.Queue(max_pending)
+        self.task = asyncio.create_task(self._fill(documents))
+
+    async def _fill(self, documents):
+        try:
+            async for document in documents:
+                await self.queue.put(document)
+            await self.queue.put(self._done)
+        except Exception as e:
+            await self.queue.put(e)
+
+    async def __aiter__(self):
+        while True:
+            document = await self.queue.get()
+            if document is self._done:
+                return
+            if isinstance(document, Exception):
+                raise document
+            yield document
+
+    def cancel(self):
+        self.task.cancel()
+
+
+async def _get_temp_file(file):
+    # Stream the upload to disk instead of holding it in memory
+    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+        while block := await file.read(READ_BLOCK_SIZE):
+            temp_file.write(block)
+        temp_file.flush()
+
+        return temp_file.name
 
-async def text_loader(files):
-    docs = []
-    for file in files:
-        file_content = await file.read()
-        text = file_content.decode("utf-8")
-        document_key = str(uuid.uuid4())
 
+async def pdf_loader(files, document_key=None):
+    """
+    Yields PDF pages in order. Pages are extracted in the parse pool, a few
+    ranges at a time so every core is busy without buffering the whole file.
+
+    Each file gets a new document key, unless `document_key` is given.
+    """
+    for file in files:
+        file_path = await _get_temp_file(file)
+        file_document_key = document_key or str(uuid.uuid4())
+        pending = deque()
+
+        try:
+            page_count = await run_in_parse_pool(count_pdf_pages, file_path)
+            next_page = 0
+
+            while pending or next_page < page_count:
+                while next_page < page_count and len(pending) < PARSE_MAX_WORKERS:
+                    stop = min(next_page + PDF_PAGES_PER_TASK, page_count)
+                    pending.append(
+                        (
+                            next_page,
+                            run_in_parse_pool(
+                                extract_pdf_pages, file_path, next_page, stop
+                            ),
+                        )
+                    )
+                    next_page = stop
+
+                start, pages = pending.popleft()
+                for page_number, text in enumerate(await pages, start=start):
+                    yield Document(
+                        page_content=text,
+                        metadata={
+                            "document_type": "pdf",
+                            "source": file.filename,
+                            "document_key": file_document_key,
+                            "page": page_number,
+                        },
+                    )
+        finally:
+            for _, pages in pending:
+                pages.cancel()
+            os.remove(file_path)
+
+
+async def text_loader(files, document_key=None):
+    """
+    Yields text files in blocks of roughly READ_BLOCK_SIZE, split on line breaks.
+    Each file gets a new document key, unless `document_key` is given.
+    """
+    for file in files:
+        decoder = codecs.getincrementaldecoder("utf-8")()
         metadata = {
             "document_type": "text",
             "source": file.filename,
-            "document_key": document_key,
+            "document_key": document_key or str(uuid.uuid4()),
         }
 
-        docs.append({"text": text, "metadata": metadata})
-
-    return docs
-
-
-async def url_loader(urls):
+        text = ""
+        while block := await file.read(READ_BLOCK_SIZE):
+            text += decoder.decode(block)
+            while len(text) >= READ_BLOCK_SIZE:
+                # Keep the last partial paragraph for the next block
+                split_at = _split_point(text)
+                if text[:split_at].strip():
+                    yield {"text": text[:split_at], "metadata": metadata}
+                text = text[split_at:]
+
+        text += decoder.decode(b"", final=True)
+        if text.strip():
+            yield {"text": text, "metadata": metadata}
+
+
+def _split_point(text: str) -> int:
+    """
+    Where to cut a buffered text: at the last paragraph break in its second
+    half, else the last line break there, else at READ_BLOCK_SIZE. Every cut
+    takes at least half the buffer, so it stays bounded.
+    """
+    for separator in ("\n\n", "\n"):
+        split_at = text.rfind(separator, len(text) // 2)
+        if split_at > 0:
+            return split_at
+    return min(len(text), READ_BLOCK_SIZE)
+
+
+async def url_loader(urls, document_key=None):
     loader = UnstructuredURLLoader(urls)
-    docs = loader.load()
-    document_key = str(uuid.uuid4())
+    document_key = document_key or str(uuid.uuid4())
 
-    for doc in docs:
+    # Fetching & partitioning the pages blocks, keep it off the event loop
+    for doc in await asyncio.to_thread(loader.load):
         doc.metadata["document_type"] = "webpage"
         doc.metadata["document_key"] = document_key
-
-    return docs
+        yield doc
 
 
 async def email_loader(emails):
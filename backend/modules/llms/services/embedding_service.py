@@ -0,0 +1,298 @@
+import re
+import time
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from typing import List
+
+import aiohttp
+import requests
+import numpy as np
+import tiktoken
+from openai import AsyncOpenAI
+
+from config import settings
+
+# The model every embedding was created with before providers were configurable
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+_embeddings_semaphore = None
+_embedding_provider = None
+
+
+def get_embeddings_semaphore() -> asyncio.Semaphore:
+    # Caps the number of embedding requests in flight across the whole process
+    global _embeddings_semaphore
+
+    if _embeddings_semaphore is None:
+        document_settings = settings.get("documents", {})
+        _embeddings_semaphore = asyncio.Semaphore(
+            document_settings.get("embedding_max_concurrency", 4)
+        )
+
+    return _embeddings_semaphore
+
+
+class EmbeddingProvider(ABC):
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        """
+        Identifies the model, embeddings are cached and indexed per model id
+        """
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        pass
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        pass
+
+    def count_tokens(self, text: str) -> int:
+        # Rough estimate, used to cap the size of embedding requests
+        return len(text) // 4 + 1
+
+
+class OpenAIEmbeddings(EmbeddingProvider):
+    DIMENSIONS = {
+        "text-embedding-ada-002": 1536,
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+    }
+
+    def __init__(self, model=DEFAULT_EMBEDDING_MODEL, dimension=None):
+        self.model = model
+        self._dimension = dimension or self.DIMENSIONS.get(model)
+        self._tokenizer = None
+        self._client = None
+
+        if self._dimension is None:
+            raise ValueError(
+                f"Unknown dimension for embedding model {model}, "
+                "set `embedding_dimension` in the [documents] settings"
+            )
+
+    @property
+    def client(self):
+        # Reuse a single client (and its connection pool) for every request
+        if self._client is None:
+            document_settings = settings.get("documents", {})
+            self._client = AsyncOpenAI(
+                api_key=settings.chat_models.get("openai_api_key", None),
+                timeout=document_settings.get("embedding_timeout", 30),
+                max_retries=document_settings.get("embedding_max_retries", 2),
+            )
+        return self._client
+
+    @property
+    def model_id(self):
+        # Unprefixed, so embeddings cached before providers existed still match
+        return self.model
+
+    @property
+    def dimension(self):
+        return self._dimension
+
+    async def embed(self, texts):
+        async with get_embeddings_semaphore():
+            response = await self.client.embeddings.create(
+                input=texts, model=self.model
+            )
+
+        serialized = response.model_dump()
+        data = sorted(serialized["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    def count_tokens(self, text):
+        if self._tokenizer is None:
+            try:
+                self._tokenizer = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                self._tokenizer = tiktoken.get_encoding("cl100k_base")
+        return len(self._tokenizer.encode(text))
+
+
+class OllamaEmbeddings(EmbeddingProvider):
+    DIMENSIONS = {
+        "nomic-embed-text": 768,
+        "mxbai-embed-large": 1024,
+        "all-minilm": 384,
+    }
+
+    def __init__(self, model, base_url=None, dimension=None):
+        self.model = model
+        self.base_url = base_url or settings.chat_models.get(
+            "ollama_base_url", "http://localhost:11434"
+        )
+        self._dimension = dimension or self.DIMENSIONS.get(model.split(":")[0])
+        self.timeout = settings.get("documents", {}).get("embedding_timeout", 30)
+
+    @property
+    def model_id(self):
+        return f"ollama/{self.model}"
+
+    @property
+    def dimension(self):
+        if self._dimension is None:
+            # Ollama doesn't report it, so embed a probe text once, on first use.
+            # Set `embedding_dimension` to skip this.
+            print(f"Probing the dimension of {self.model} embeddings..")
+            response = requests.post(
+                f"{self.base_url}/api/embeddings",
+                json={"model": self.model, "prompt": "dimension"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            self._dimension = len(response.json()["embedding"])
+        return self._dimension
+
+    async def embed(self, texts):
+        # /api/embeddings takes a single prompt, so texts are sent concurrently
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+
+            async def embed_text(text):
+                async with get_embeddings_semaphore():
+                    async with session.post(
+                        f"{self.base_url}/api/embeddings",
+                        json={"model": self.model, "prompt": text},
+                    ) as response:
+                        response.raise_for_status()
+                        return (await response.json())["embedding"]
+
+            return await asyncio.gather(*[embed_text(text) for text in texts])
+
+
+class HashEmbeddings(EmbeddingProvider):
+    """
+    Deterministic feature-hashing embeddings, computed locally. Texts sharing
+    words land close together, which is enough for tests and offline setups.
+    """
+
+    def __init__(self, dimension=256):
+        self._dimension = dimension
+
+    @property
+    def model_id(self):
+        return f"hash-{self._dimension}"
+
+    @property
+    def dimension(self):
+        return self._dimension
+
+    def embed_text(self, text):
+        vector = np.zeros(self._dimension, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = int.from_bytes(hashlib.sha256(token.encode()).digest()[:8], "big")
+            sign = 1.0 if digest & 1 else -1.0
+            vector[(digest >> 1) % self._dimension] += sign
+
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    async def embed(self, texts):
+        return [self.embed_text(text) for text in texts]
+
+
+class EmbeddingFactory:
+    @staticmethod
+    def create_provider(document_settings) -> EmbeddingProvider:
+        provider = document_settings.get("embedding_provider", "openai")
+        model = document_settings.get("embedding_model")
+        dimension = document_settings.get("embedding_dimension")
+
+        if provider == "openai":
+            return OpenAIEmbeddings(model or DEFAULT_EMBEDDING_MODEL, dimension)
+        elif provider == "ollama":
+            return OllamaEmbeddings(model or "nomic-embed-text", dimension=dimension)
+        elif provider == "hash":
+            return HashEmbeddings(dimension or 256)
+        else:
+            raise ValueError(f"Unknown embedding provider: {provider}")
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """
+    Returns the provider configured in the [documents] settings
+    """
+    global _embedding_provider
+
+    if _embedding_provider is None:
+        _embedding_provider = EmbeddingFactory.create_provider(
+            settings.get("documents", {})
+        )
+
+    return _embedding_provider
+
+
+def set_embedding_provider(provider: EmbeddingProvider):
+    """
+    Replace the configured provider, e.g. with a local one for benchmarks
+    """
+    global _embedding_provider
+    _embedding_provider = provider
+
+
+async def get_embeddings(doc: str):
+    embeddings = await get_embedding_provider().embed([doc])
+    return embeddings[0]
+
+
+def batch_texts(docs: List[str], batch_size: int, max_batch_tokens: int):
+    """
+    Group texts into batches capped by both item count and total token count
+    """
+    provider = get_embedding_provider()
+
+    batch = []
+    batch_tokens = 0
+
+    for doc in docs:
+        doc_tokens = provider.count_tokens(doc)
+
+        if batch and (
+            len(batch) >= batch_size or batch_tokens + doc_tokens > max_batch_tokens
+        ):
+            yield batch
+            batch = []
+            batch_tokens = 0
+
+        batch.append(doc)
+        batch_tokens += doc_tokens
+
+    if batch:
+        yield batch
+
+
+async def get_embeddings_batch(
+    docs: List[str], batch_size: int = None, max_batch_tokens: int = None
+) -> List[List[float]]:
+    """
+    Embed many texts using as few requests as possible, preserving input order
+    """
+    document_settings = settings.get("documents", {})
+    batch_size = batch_size or document_settings.get("embedding_batch_size", 100)
+    max_batch_tokens = max_batch_tokens or document_settings.get(
+        "embedding_batch_max_tokens", 50000
+    )
+
+    provider = get_embedding_provider()
+    start_time = time.perf_counter()
+
+    # Batches are sent concurrently, bounded by the embeddings semaphore
+    batches = list(batch_texts(docs, batch_size, max_batch_tokens))
+    results = await asyncio.gather(*[provider.embed(batch) for batch in batches])
+    embeddings = [embedding for result in results for embedding in result]
+
+    elapsed = time.perf_counter() - start_time
+    if docs:
+        print(
+            f"Embedded {len(docs)} chunks with {provider.model_id} in {elapsed:.2f}s "
+            f"({len(docs) / max(elapsed, 1e-6):.1f} chunks/s)"
+        )
+
+    return embeddings
@@ -86,6 +86,18 @@ class GoogleAI(LLMInterface):
             await self.message_handler.send_alert_to_ui(message)
             return None
 
+    async def create_completion(self, context) -> Union[str, None]:
+        try:
+            model = self.client.GenerativeModel(self.llm_settings.get('model', 'gemini-pro'))
+            messages = self.model.format_messages(context)
+            params = self.model.generate_params(messages, stream=False)
+            response = await model.generate_content_async(**params)
+            return response.text
+        except Exception as e:
+            print(type(e))
+            print(e)
+            return None
+
 
 class GoogleAIModel:
     def __init__(self, llm_settings, message_handler):
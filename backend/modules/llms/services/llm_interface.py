@@ -9,4 +9,12 @@ class LLMInterface(ABC):
 
     @abstractmethod
     def get_models(self):
+        pass
+
+    @abstractmethod
+    async def create_completion(self, context):
+        """
+        Returns the reply's text only, without streaming it to the UI or saving
+        it, for requests made on the app's own behalf. Returns None on errors.
+        """
         pass
\ No newline at end of file
@@ -94,6 +94,24 @@ class Ollama(LLMInterface):
             print(f"An exception occurred: {e}")
             return None
 
+    async def create_completion(self, context) -> Union[str, None]:
+        data = {
+            "model": self.llm_settings["model"],
+            "prompt": self.format_messages(context),
+            "stream": False,
+        }
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    f"{self.base_url}/api/generate", json=data
+                ) as resp:
+                    resp.raise_for_status()
+                    return (await resp.json())["response"]
+        except Exception as e:
+            print(f"An exception occurred: {e}")
+            return None
+
     def format_messages(self, context):
         inst_formatted_chain = ""
         for message in context.compiled_chain():
@@ -1,12 +1,27 @@
 import json
+import asyncio
 from typing import Union
-from openai import AsyncOpenAI
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
 
 from .llm_interface import LLMInterface
 from ..schemas import ChatModel
 from config import settings
 from modules.messages.schemas import AssistantMessage, AlertMessage, Content
 
+# Errors worth another try, e.g. rate limits & network trouble
+RETRYABLE_ERRORS = (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
 
 class OpenAI(LLMInterface):
     def __init__(self, llm_settings=None, message_handler=None):
@@ -109,6 +124,23 @@ class OpenAI(LLMInterface):
         print("Failed after 3 retries.")
         return None
 
+    async def create_completion(self, context) -> Union[str, None]:
+        messages = self.model.format_messages(context)
+        params = self.model.generate_params(messages, stream=False)
+
+        for attempt in range(3):
+            try:
+                response = await self.client.chat.completions.create(**params)
+                return response.choices[0].message.content
+            except RETRYABLE_ERRORS as e:
+                print(f"Completion attempt {attempt + 1} failed: {e}")
+                await asyncio.sleep(2**attempt)
+            except Exception as e:
+                print("An exception occured: ", e)
+                return None
+        print("Failed after 3 retries.")
+        return None
+
 
 class OpenAIModel:
     def __init__(self, llm_settings, message_handler):
@@ -0,0 +1,96 @@
+"""
+MessageChain microbenchmark, run from the backend directory:
+
+    python -m modules.messages.benchmark --sizes 1000 10000
+
+Builds chains the way ChatService.add_conversation_to_context does, newest
+message first, and times building them and reading the compiled chain the way
+the LLM services do. Messages are created before timing starts, so both
+implementations only pay for putting them in order.
+"""
+
+import time
+import argparse
+
+from .schemas import SnippetMessage, SystemMessage, UserMessage
+from .services.message_chain import MessageChain
+
+
+def create_messages(size: int):
+    # The system message, a snippet, then the history oldest first
+    head = [
+        SystemMessage(content={"text": "You are a helpful assistant."}),
+        SnippetMessage(content={"text": "A snippet of context"}),
+    ]
+    history = [
+        UserMessage(content={"text": f"Message {number}"}, id=number, tokens=3)
+        for number in range(size)
+    ]
+    return head, history
+
+
+def build_chain(head, history):
+    context = MessageChain()
+    for message in head:
+        context._add(message)
+    for message in reversed(history):
+        context._add(message, history=True)
+    return context
+
+
+def build_list(head, history):
+    # What MessageChain used to do, insert each one at a fixed position of a list
+    chain = list(head)
+    for message in reversed(history):
+        chain.insert(len(head), message)
+    return chain
+
+
+def time_call(function, repeat: int = 5):
+    # Best of `repeat` runs, in milliseconds
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main(sizes, reads):
+    print(
+        f"{'Messages':>9}{'Build ms':>11}{'List inserts ms':>17}"
+        f"{f'{reads} reads ms':>14}{f'{reads} copies ms':>15}"
+    )
+
+    for size in sizes:
+        head, history = create_messages(size)
+        build_ms = time_call(lambda: build_chain(head, history))
+        list_inserts_ms = time_call(lambda: build_list(head, history))
+
+        context = build_chain(head, history)
+        messages = build_list(head, history)
+        assert list(context.get_chain()) == messages
+
+        def read_chain():
+            # Providers call compiled_chain() several times per request
+            for _ in range(reads):
+                context.compiled_chain()
+
+        def copy_chain():
+            # What compiled_chain() used to cost, a copy per call
+            for _ in range(reads):
+                list(messages)
+
+        print(
+            f"{size:>9}{build_ms:>11.1f}{list_inserts_ms:>17.1f}"
+            f"{time_call(read_chain):>14.2f}{time_call(copy_chain):>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MessageChain microbenchmark")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--reads", type=int, default=10)
+    args = parser.parse_args()
+
+    main(args.sizes, args.reads)
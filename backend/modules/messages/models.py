@@ -7,6 +7,7 @@ from sqlalchemy import (
     Boolean,
     DateTime,
     JSON,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -16,6 +17,10 @@ from database import Base
 
 class MessageModel(Base):
     __tablename__ = "message_model"
+    __table_args__ = (
+        # History is read newest first, a page at a time
+        Index("ix_message_model_conversation_id_id", "conversation_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     role = Column(String)
@@ -27,6 +32,11 @@ class MessageModel(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_archived = Column(Boolean, default=False)
     conversation_id = Column(Integer, ForeignKey("conversation_model.id"))
+    # Counted once when the message is saved, see token_counter.TOKENIZER
+    token_count = Column(Integer, nullable=True)
+    tokenizer = Column(String, nullable=True)
+    # Embedded into the conversation's message index, for recall of old turns
+    is_indexed = Column(Boolean, default=False)
 
     conversation = relationship("ConversationModel", back_populates="messages")
     bookmark = relationship("BookmarkModel", back_populates="message")
@@ -1,5 +1,6 @@
 import json
 import base64
+from collections import deque
 from PIL import Image
 from io import BytesIO
 
@@ -14,7 +15,12 @@ from ..schemas import (
 
 class MessageChain:
     """
-    Helper class to construct a conversation / message chain to pass to AI
+    Helper class to construct a conversation / message chain to pass to AI.
+
+    The chain is the system message and snippets, then the conversation
+    history, then the function output and user message of this turn. Messages
+    are kept in deques so both appending and prepending history are O(1), and
+    the compiled chain is cached until the chain changes.
     """
 
     def __init__(
@@ -25,8 +31,10 @@ class MessageChain:
         conversation_id: int = None,
     ):
         self.conversation_id = conversation_id
-        self.messages = []
+        self.messages = deque()
+        self.history = deque()
         self.metadata = []
+        self._compiled_chain = None
 
         if system_message:
             self.messages.append(SystemMessage(content={"text": system_message}))
@@ -34,13 +42,34 @@ class MessageChain:
         self.user_message = self._process_user_message(user_message)
         self.function_message = function_message
 
+    @property
+    def user_message(self):
+        return self._user_message
+
+    @user_message.setter
+    def user_message(self, message):
+        self._user_message = message
+        self._compiled_chain = None
+
+    @property
+    def function_message(self):
+        return self._function_message
+
+    @function_message.setter
+    def function_message(self, message):
+        self._function_message = message
+        self._compiled_chain = None
+
     def compiled_chain(self):
-        compiled_chain = list(self.messages)
-        if self.function_message:
-            compiled_chain += [self.function_message]
-        if self.user_message:
-            compiled_chain += [self.user_message]
-        return compiled_chain
+        # Cached, so it's shared by every caller and must not be modified
+        if self._compiled_chain is None:
+            compiled_chain = [*self.messages, *self.history]
+            if self.function_message:
+                compiled_chain.append(self.function_message)
+            if self.user_message:
+                compiled_chain.append(self.user_message)
+            self._compiled_chain = tuple(compiled_chain)
+        return self._compiled_chain
 
     def get_chain(self):
         # Public method to get the complete list of messages
@@ -61,28 +90,45 @@ class MessageChain:
 
     def get_precompiled_chain(self):
         # Get the list of messages without the user message and/or tool output
-        return self.messages
+        return [*self.messages, *self.history]
+
+    def _add(self, message, index=None, history=False):
+        if history:
+            # History is added newest first, so each message goes before the last
+            self.history.appendleft(message)
+        elif index is None:
+            self.messages.append(message)
+        elif index == 0:
+            self.messages.appendleft(message)
+        else:
+            self.messages.insert(index, message)
+        self._compiled_chain = None
 
     def add_system_message(self, message, id=None, tokens=None, index=None):
         # Add a system message to the list if there is no existing system message
-        if any(x.role == "system" for x in self.messages):
+        if self.messages and self.messages[0].role == "system":
             return
         system_message = SystemMessage(content=message, id=id, tokens=tokens)
-        self.messages.insert(0, system_message)
+        self._add(system_message, index=0)
 
-    def add_user_message(self, message, id=None, tokens=None, index=None):
-        # Add a user message to the list at a specified index or at the end
+    def add_user_message(
+        self, message, id=None, tokens=None, index=None, history=False
+    ):
+        # Add a user message at a specified index, to the history or at the end
         if message:
             message_object = UserMessage(content=message, id=id, tokens=tokens)
-            if index is not None:
-                self.messages.insert(index, message_object)
-            else:
-                self.messages.append(message_object)
+            self._add(message_object, index, history)
 
     def add_ai_message(
-        self, message, function_call=None, id=None, tokens=None, index=None
+        self,
+        message,
+        function_call=None,
+        id=None,
+        tokens=None,
+        index=None,
+        history=False,
     ):
-        # Add an assistant message to the list at a specified index or at the end
+        # Add an assistant message at a specified index, to the history or at the end
         if message or function_call:
             if function_call:
                 function_call["arguments"] = json.dumps(function_call["arguments"])
@@ -93,32 +139,23 @@ class MessageChain:
                 id=id,
                 tokens=tokens,
             )
-            if index is not None:
-                self.messages.insert(index, ai_message)
-            else:
-                self.messages.append(ai_message)
+            self._add(ai_message, index, history)
 
     def add_function_message(
-        self, message, function_call, id=None, tokens=None, index=None
+        self, message, function_call, id=None, tokens=None, index=None, history=False
     ):
-        # Add function/tool output to the list at a specified index or at the end
+        # Add function/tool output at a specified index, to the history or at the end
         if message:
             function_message = FunctionMessage(
                 content=message, function_call=function_call, id=id, tokens=tokens
             )
-            if index is not None:
-                self.messages.insert(index, function_message)
-            else:
-                self.messages.append(function_message)
+            self._add(function_message, index, history)
 
     def add_snippet(self, message, id=None, tokens=None, index=None):
         # Add snippet to the list at a specified index or at the end
         if message:
             snippet = SnippetMessage(content={"text": message}, id=id, tokens=tokens)
-            if index is not None:
-                self.messages.insert(index, snippet)
-            else:
-                self.messages.append(snippet)
+            self._add(snippet, index)
 
     def add_metadata(self, metadata):
         # Add metadata to the list
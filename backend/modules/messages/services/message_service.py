@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session, joinedload
 
 from ..models import *
 from ..schemas import *
+from .token_counter import TOKENIZER, count_tokens
 
 
 class MessageService:
@@ -18,6 +19,7 @@ class MessageService:
         function_call: dict = None,
         status: str = None,
         metadata: list = None,
+        tokens: int = None,
         *args,
         **kwargs,
     ):
@@ -27,6 +29,10 @@ class MessageService:
             print(f"Invalid content format: {e}")
             return
 
+        # `tokens` is passed when the message was already counted for context
+        if tokens is None:
+            tokens = count_tokens(content.get("text"))
+
         message = MessageModel(
             role=role,
             content=content,
@@ -35,6 +41,8 @@ class MessageService:
             function_call=function_call,
             status=status,
             meta_data=metadata,
+            token_count=tokens,
+            tokenizer=TOKENIZER,
         )
 
         self.db.add(message)
@@ -65,6 +73,93 @@ class MessageService:
 
         return query.order_by(MessageModel.id.desc()).all()
 
+    def get_messages_page(
+        self, conversation_id: int, before_id: int = None, limit: int = 25
+    ):
+        """
+        Non-archived messages newest first, older than `before_id` if given
+        """
+        query = self.db.query(MessageModel).filter(
+            MessageModel.conversation_id == conversation_id,
+            MessageModel.is_archived == False,
+        )
+
+        if before_id is not None:
+            query = query.filter(MessageModel.id < before_id)
+
+        return query.order_by(MessageModel.id.desc()).limit(limit).all()
+
+    def get_messages_between(
+        self, conversation_id: int, after_id: int, until_id: int, limit: int = 100
+    ):
+        """
+        Non-archived messages oldest first, newer than `after_id` (if given) and
+        up to and including `until_id`
+        """
+        query = self.db.query(MessageModel).filter(
+            MessageModel.conversation_id == conversation_id,
+            MessageModel.is_archived == False,
+            MessageModel.id <= until_id,
+        )
+
+        if after_id is not None:
+            query = query.filter(MessageModel.id > after_id)
+
+        return query.order_by(MessageModel.id).limit(limit).all()
+
+    def get_messages_by_ids(self, message_ids: list):
+        return (
+            self.db.query(MessageModel)
+            .filter(
+                MessageModel.id.in_(message_ids),
+                MessageModel.is_archived == False,
+            )
+            .all()
+        )
+
+    def get_adjacent_message(self, message: MessageModel, newer: bool = True):
+        """
+        The non-archived message right after (or before) `message` in its conversation
+        """
+        query = self.db.query(MessageModel).filter(
+            MessageModel.conversation_id == message.conversation_id,
+            MessageModel.is_archived == False,
+        )
+
+        if newer:
+            query = query.filter(MessageModel.id > message.id).order_by(MessageModel.id)
+        else:
+            query = query.filter(MessageModel.id < message.id).order_by(
+                MessageModel.id.desc()
+            )
+
+        return query.first()
+
+    def get_unindexed_messages(self, conversation_id: int, limit: int = 100):
+        return (
+            self.db.query(MessageModel)
+            .filter(
+                MessageModel.conversation_id == conversation_id,
+                MessageModel.is_archived == False,
+                MessageModel.is_indexed == False,
+            )
+            .order_by(MessageModel.id)
+            .limit(limit)
+            .all()
+        )
+
+    def set_indexed(self, message_ids: list, is_indexed: bool = True):
+        self.db.query(MessageModel).filter(MessageModel.id.in_(message_ids)).update(
+            {MessageModel.is_indexed: is_indexed}, synchronize_session=False
+        )
+        self.db.commit()
+
+    def clear_indexed(self, conversation_id: int):
+        self.db.query(MessageModel).filter(
+            MessageModel.conversation_id == conversation_id
+        ).update({MessageModel.is_indexed: False}, synchronize_session=False)
+        self.db.commit()
+
     def get_bookmarks(self):
         bookmarks = self.db.query(BookmarkModel).all()
         return bookmarks
@@ -0,0 +1,25 @@
+from typing import Optional
+
+import tiktoken
+
+# Stored token counts are tagged with the tokenizer that produced them, counts
+# made by any other tokenizer are ignored
+TOKENIZER = "cl100k_base"
+
+_encoding = None
+
+
+def get_encoding():
+    global _encoding
+
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding(TOKENIZER)
+
+    return _encoding
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    # Special tokens in user text are counted as plain text instead of raising
+    return len(get_encoding().encode(text, disallowed_special=()))
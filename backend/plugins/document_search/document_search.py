@@ -8,13 +8,15 @@ class DocumentSearch(BasePlugin):
         self.document_manager = DocumentManager(conversation_id=conversation_id)
 
     @snippet
-    def insert_similar_documents(self, context):
+    async def insert_similar_documents(self, context):
         max_results = self.settings["insert_similar_documents"]["max_results"]
         query = context.get_user_message()
 
         if query and query.text:
             document_data = []
-            context_docs = self.document_manager.similar_search(query.text)
+            context_docs = await self.document_manager.similar_search(
+                query.text, results=max_results
+            )
             context_str = "The following document snippets have been provided as context to this conversation, reference as needed:\n\n"
 
             for doc in context_docs[:max_results]:
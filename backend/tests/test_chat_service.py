@@ -0,0 +1,121 @@
+import asyncio
+
+from modules.conversations.services import chat_service
+from modules.conversations.services.chat_service import ChatService
+from modules.conversations.services.conversation_service import ConversationService
+from modules.messages.models import MessageModel
+from modules.messages.services.message_chain import MessageChain
+from modules.messages.services.message_service import MessageService
+from modules.messages.services.token_counter import TOKENIZER
+
+
+def test_history_is_read_in_pages_until_the_budget_is_spent(db_session, monkeypatch):
+    monkeypatch.setattr(chat_service, "count_tokens", lambda text: len(text.split()))
+    page_limits = []
+    get_messages_page = MessageService.get_messages_page
+
+    def spy(self, conversation_id, before_id=None, limit=25):
+        page_limits.append(limit)
+        return get_messages_page(self, conversation_id, before_id, limit)
+
+    monkeypatch.setattr(MessageService, "get_messages_page", spy)
+
+    conversation = ConversationService(db_session).create_conversation()
+    messages = [
+        MessageModel(
+            conversation_id=conversation.id,
+            role="user",
+            content={"text": f"message {number}"},
+            token_count=10,
+            tokenizer=TOKENIZER,
+        )
+        for number in range(200)
+    ]
+    db_session.add_all(messages)
+    db_session.commit()
+    # The system prompt is 2 tokens, then 30 messages of 10 tokens fit
+    conversation.settings = {"max_input_tokens": 2 + 30 * 10 + 5}
+
+    context = MessageChain(system_message="system prompt")
+    asyncio.run(
+        ChatService(db_session, message_handler=None).add_conversation_to_context(
+            context, conversation
+        )
+    )
+
+    assert [message.id for message in context.history] == [
+        message.id for message in messages[-30:]
+    ]
+    # 25 + 50 messages cover the budget, the rest are never loaded
+    assert page_limits == [25, 50]
+
+
+def _history_context(db_session, monkeypatch, messages, max_input_tokens=1000):
+    """
+    Add `messages` as a conversation's history to a new context, returns the
+    context & the texts that had to be tokenized
+    """
+    counted_texts = []
+
+    def count_tokens(text):
+        counted_texts.append(text)
+        return len(text.split())
+
+    monkeypatch.setattr(chat_service, "count_tokens", count_tokens)
+    conversation = ConversationService(db_session).create_conversation()
+    for message in messages:
+        message.conversation_id = conversation.id
+        message.role = "user"
+    db_session.add_all(messages)
+    db_session.commit()
+    conversation.settings = {"max_input_tokens": max_input_tokens}
+
+    context = MessageChain(system_message="system prompt")
+    asyncio.run(
+        ChatService(db_session, message_handler=None).add_conversation_to_context(
+            context, conversation
+        )
+    )
+    return context, counted_texts
+
+
+def test_history_uses_stored_token_counts(db_session, monkeypatch):
+    messages = [
+        MessageModel(
+            content={"text": f"message {number}"},
+            token_count=100,
+            tokenizer=TOKENIZER,
+        )
+        for number in range(5)
+    ]
+
+    context, counted_texts = _history_context(
+        db_session, monkeypatch, messages, max_input_tokens=2 + 3 * 100
+    )
+
+    # Only this turn is tokenized, the stored counts decide what fits
+    assert counted_texts == ["system prompt"]
+    assert [message.tokens for message in context.history] == [100] * 3
+    assert [message.id for message in context.history] == [
+        message.id for message in messages[-3:]
+    ]
+
+
+def test_history_counts_are_recounted_when_missing_or_from_another_tokenizer(
+    db_session, monkeypatch
+):
+    messages = [
+        MessageModel(
+            content={"text": "stored count"}, token_count=50, tokenizer=TOKENIZER
+        ),
+        MessageModel(
+            content={"text": "other tokenizer"}, token_count=50, tokenizer="gpt2"
+        ),
+        # Saved before counts were stored, or the backfill was skipped
+        MessageModel(content={"text": "no stored count"}),
+    ]
+
+    context, counted_texts = _history_context(db_session, monkeypatch, messages)
+
+    assert counted_texts == ["system prompt", "no stored count", "other tokenizer"]
+    assert [message.tokens for message in context.history] == [50, 2, 3]
@@ -0,0 +1,53 @@
+import asyncio
+import io
+
+from backend.modules.documents import utils
+from backend.modules.documents.utils import text_loader
+
+
+class _Upload:
+    def __init__(self, text, filename="notes.txt"):
+        self.file = io.BytesIO(text.encode())
+        self.filename = filename
+
+    async def read(self, size):
+        return self.file.read(size)
+
+
+def _load(text, monkeypatch, block_size=1000):
+    monkeypatch.setattr(utils, "READ_BLOCK_SIZE", block_size)
+
+    async def collect():
+        return [document async for document in text_loader([_Upload(text)])]
+
+    return asyncio.run(collect())
+
+
+def test_text_is_split_on_paragraphs(monkeypatch):
+    paragraphs = [f"paragraph {number} " * 20 for number in range(20)]
+    documents = _load("\n\n".join(paragraphs), monkeypatch)
+
+    assert len(documents) > 1
+    assert "".join(document["text"] for document in documents) == "\n\n".join(
+        paragraphs
+    )
+
+
+def test_text_without_late_breaks_is_cut_in_bounded_chunks(monkeypatch):
+    # One blank line in the header, then no line breaks at all
+    text = "header\n\n" + "x" * 34000
+    documents = _load(text, monkeypatch)
+
+    assert all(document["text"].strip() for document in documents)
+    assert max(len(document["text"]) for document in documents) <= 2000
+    assert "".join(document["text"] for document in documents) == text
+
+
+def test_given_document_key_is_kept_across_runs(monkeypatch):
+    monkeypatch.setattr(utils, "READ_BLOCK_SIZE", 1000)
+
+    async def keys():
+        documents = text_loader([_Upload("some text")], document_key="job-key")
+        return {document["metadata"]["document_key"] async for document in documents}
+
+    assert asyncio.run(keys()) == asyncio.run(keys()) == {"job-key"}
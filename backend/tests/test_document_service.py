@@ -0,0 +1,213 @@
+import json
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from modules.conversations.services.conversation_service import ConversationService
+from modules.documents.models import DocumentModel
+from modules.documents.routes import get_documents
+from modules.documents.services import document_service
+from modules.documents.services.document_service import (
+    DocumentManager,
+    DocumentService,
+)
+from modules.documents.services.vector_store import VectorIndex
+from modules.llms.services import embedding_service
+from modules.llms.services.embedding_service import HashEmbeddings
+
+
+def _chunk(chunk_hash_id, document_key="key"):
+    return {
+        "id": chunk_hash_id,
+        "type": "text/plain",
+        "collection": None,
+        "title": "notes.txt",
+        "content": f"content of {chunk_hash_id}",
+        "source": "notes.txt",
+        "document_key": document_key,
+    }
+
+
+def _hashes(count):
+    # The test database is shared by the whole module
+    return [uuid.uuid4().hex for _ in range(count)]
+
+
+def test_bulk_create_skips_stored_hashes(db_session):
+    service = DocumentService(db_session)
+    first, second, third = _hashes(3)
+
+    stored = service.bulk_create_documents([_chunk(first), _chunk(second)])
+    db_session.commit()
+    created = service.bulk_create_documents([_chunk(third), _chunk(second)])
+    db_session.commit()
+
+    assert list(stored) == [first, second]
+    assert list(created) == [third]
+    assert created[third] > stored[second]
+
+
+def test_save_chunks_links_reused_hashes(db_session, tmp_path, monkeypatch):
+    async def get_embeddings(self, chunks):
+        return {
+            chunk_hash_id: np.random.rand(8).astype(np.float32)
+            for chunk_hash_id in chunks
+        }
+
+    monkeypatch.setattr(
+        document_service.EmbeddingCache, "get_embeddings", get_embeddings
+    )
+    vector_index = VectorIndex(str(tmp_path / "index"), dimension=8)
+    manager = DocumentManager(db_session, vector_index=vector_index)
+    conversation_service = ConversationService(db_session)
+    first_conversation = conversation_service.create_conversation()
+    second_conversation = conversation_service.create_conversation()
+    first, shared, last = _hashes(3)
+
+    asyncio.run(
+        manager._save_chunks([_chunk(first), _chunk(shared)], first_conversation.id)
+    )
+    asyncio.run(
+        manager._save_chunks(
+            [_chunk(shared), _chunk(last), _chunk(last)], second_conversation.id
+        )
+    )
+
+    db_session.refresh(second_conversation)
+    documents = DocumentService(db_session).get_documents_by_hashes(
+        [first, shared, last]
+    )
+    assert {doc.chunk_hash_id for doc in second_conversation.documents} == {
+        shared,
+        last,
+    }
+    assert all(doc.faiss_index == doc.id for doc in documents)
+    assert vector_index.ntotal == 3
+
+
+def test_document_listing_is_grouped_and_counted(db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        document_service,
+        "get_document_index",
+        lambda: VectorIndex(str(tmp_path / "index"), dimension=8),
+    )
+    conversation = ConversationService(db_session).create_conversation()
+    service = DocumentService(db_session)
+    keys = [uuid.uuid4().hex for _ in range(3)]
+    for key in keys:
+        created = service.bulk_create_documents(
+            [_chunk(chunk_hash_id, key) for chunk_hash_id in _hashes(2)]
+        )
+        service.bulk_add_documents_to_conversation(
+            conversation.id, list(created.values())
+        )
+    db_session.commit()
+
+    response = asyncio.run(
+        get_documents(
+            conversation.id, conversation_only=True, limit=2, offset=0, db=db_session
+        )
+    )
+
+    assert response.headers["X-Total-Count"] == "3"
+    documents = json.loads(response.body)
+    assert len(documents) == 2
+    assert all(document["chunk_count"] == 2 for document in documents)
+    assert all(document["document_key"] in keys for document in documents)
+    assert all(
+        document["conversation_ids"] == [conversation.id] for document in documents
+    )
+
+
+def _indexed_chunk(service, content):
+    chunk_hash_id = uuid.uuid4().hex
+    chunk = {**_chunk(chunk_hash_id), "content": content}
+    created = service.bulk_create_documents([chunk])
+    service.set_faiss_indices_by_ids(list(created.values()))
+    service.db.commit()
+    return service.db.get(DocumentModel, created[chunk_hash_id])
+
+
+def test_fulltext_index_follows_inserts_updates_and_deletes(db_session):
+    service = DocumentService(db_session)
+    old_word, new_word = (f"w{uuid.uuid4().hex}" for _ in range(2))
+    document = _indexed_chunk(service, f"notes about {old_word}")
+
+    assert service.search_fulltext(old_word, 10) == [document]
+
+    document.content = f"notes about {new_word}"
+    db_session.commit()
+    assert service.search_fulltext(old_word, 10) == []
+    assert service.search_fulltext(new_word, 10) == [document]
+
+    service.delete_documents_by_key(document.document_key)
+    assert service.search_fulltext(new_word, 10) == []
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        'say "hello',
+        "NOT AND OR NEAR(",
+        "title:foo* ^bar -baz",
+        "it's {col1 col2} : * ( )",
+        "",
+    ],
+)
+def test_fulltext_search_escapes_query_syntax(db_session, text):
+    service = DocumentService(db_session)
+    word = f"w{uuid.uuid4().hex}"
+    document = _indexed_chunk(service, f"{text} {word}")
+
+    assert isinstance(service.search_fulltext(text, 10), list)
+    assert service.search_fulltext(f'{text} "{word}', 10)[0] == document
+
+
+def test_rank_fusion_puts_documents_in_both_rankings_first(db_session, tmp_path):
+    manager = DocumentManager(
+        db_session, vector_index=VectorIndex(str(tmp_path / "index"), dimension=8)
+    )
+    vector_only, lexical_only, both = (SimpleNamespace(id=id) for id in (1, 2, 3))
+
+    fused = manager.fuse_rankings(
+        [(vector_only, 0.1), (both, 0.2)], [lexical_only, both]
+    )
+
+    # Second in both rankings beats first in just one, ties keep vector order
+    assert [(doc.id, dist) for doc, dist in fused] == [
+        (3, 0.2),
+        (1, 0.1),
+        (2, None),
+    ]
+
+
+def test_model_change_reindexes_every_chunk_with_the_new_model(
+    db_session, tmp_path, monkeypatch
+):
+    path = str(tmp_path / "index")
+    old_provider, new_provider = HashEmbeddings(8), HashEmbeddings(16)
+    monkeypatch.setattr(embedding_service, "_embedding_provider", old_provider)
+    manager = DocumentManager(
+        db_session, vector_index=VectorIndex(path, 8, model=old_provider.model_id)
+    )
+    chunks = [_chunk(chunk_hash_id) for chunk_hash_id in _hashes(3)]
+    asyncio.run(manager.save_chunks(chunks))
+
+    monkeypatch.setattr(embedding_service, "_embedding_provider", new_provider)
+    vector_index = VectorIndex(path, 16, model=new_provider.model_id)
+    assert vector_index.model_changed
+    manager = DocumentManager(db_session, vector_index=vector_index)
+    # The old vectors are dropped before anything is indexed again
+    assert vector_index.ntotal == 0
+    asyncio.run(manager.index_unindexed_documents())
+
+    ids, vectors = vector_index.get_vectors()
+    documents = {doc.id: doc for doc in db_session.query(DocumentModel).all()}
+    assert sorted(ids.tolist()) == sorted(documents)
+    assert vectors.shape[1] == 16
+    for id, vector in zip(ids.tolist(), vectors):
+        expected = new_provider.embed_text(documents[id].content)
+        assert np.allclose(vector, expected, atol=1e-6)
+    assert not VectorIndex(path, 16, model=new_provider.model_id).model_changed
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+from modules.documents.services import embedding_cache
+from modules.documents.services.document_service import DocumentManager
+from modules.documents.services.embedding_cache import EmbeddingCache
+from modules.documents.services.vector_store import VectorIndex
+
+
+def _spy_embeddings(monkeypatch):
+    # Records every text sent to the embedding provider
+    embedded_texts = []
+
+    async def get_embeddings_batch(texts):
+        embedded_texts.extend(texts)
+        return [np.random.rand(8).astype(np.float32) for _ in texts]
+
+    monkeypatch.setattr(embedding_cache, "get_embeddings_batch", get_embeddings_batch)
+    return embedded_texts
+
+
+def test_cache_hits_embed_nothing(db_session, monkeypatch):
+    embedded_texts = _spy_embeddings(monkeypatch)
+    cache = EmbeddingCache(db_session, model="model")
+    chunks = {uuid.uuid4().hex: f"text {number}" for number in range(3)}
+
+    first = asyncio.run(cache.get_embeddings(chunks))
+    db_session.commit()
+    embedded_texts.clear()
+    second = asyncio.run(cache.get_embeddings(chunks))
+
+    assert embedded_texts == []
+    assert all(np.array_equal(first[key], second[key]) for key in chunks)
+
+
+def test_cache_misses_for_another_model(db_session, monkeypatch):
+    embedded_texts = _spy_embeddings(monkeypatch)
+    chunk_hash_id = uuid.uuid4().hex
+    chunks = {chunk_hash_id: "text"}
+
+    asyncio.run(EmbeddingCache(db_session, model="old").get_embeddings(chunks))
+    db_session.commit()
+
+    assert EmbeddingCache(db_session, model="new").get_many([chunk_hash_id]) == {}
+    asyncio.run(EmbeddingCache(db_session, model="new").get_embeddings(chunks))
+    assert embedded_texts == ["text", "text"]
+
+
+def test_cached_embeddings_persist_with_the_ingested_chunks(
+    db_session, tmp_path, monkeypatch
+):
+    _spy_embeddings(monkeypatch)
+    manager = DocumentManager(
+        db_session, vector_index=VectorIndex(str(tmp_path / "index"), dimension=8)
+    )
+    chunk_hash_id = uuid.uuid4().hex
+    chunk = {
+        "id": chunk_hash_id,
+        "type": "text/plain",
+        "collection": None,
+        "title": "notes.txt",
+        "content": "notes",
+        "source": "notes.txt",
+        "document_key": "key",
+    }
+
+    asyncio.run(manager.save_chunks([chunk]))
+
+    # Read back through a separate connection, after the ingestion committed
+    other_session = sessionmaker(bind=db_session.get_bind())()
+    try:
+        cached = EmbeddingCache(other_session).get_many([chunk_hash_id])
+    finally:
+        other_session.close()
+    assert list(cached) == [chunk_hash_id]
+    assert cached[chunk_hash_id].shape == (8,)
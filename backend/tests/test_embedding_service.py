@@ -0,0 +1,74 @@
+import pytest
+from modules.llms.services import embedding_service
+from modules.llms.services.embedding_service import (
+    DEFAULT_EMBEDDING_MODEL,
+    EmbeddingFactory,
+    HashEmbeddings,
+    OllamaEmbeddings,
+    OpenAIEmbeddings,
+    batch_texts,
+)
+
+
+def test_factory_defaults_to_openai():
+    provider = EmbeddingFactory.create_provider({})
+
+    assert isinstance(provider, OpenAIEmbeddings)
+    assert provider.model_id == DEFAULT_EMBEDDING_MODEL
+    assert provider.dimension == 1536
+
+
+def test_factory_creates_configured_providers():
+    openai = EmbeddingFactory.create_provider(
+        {"embedding_provider": "openai", "embedding_model": "text-embedding-3-large"}
+    )
+    ollama = EmbeddingFactory.create_provider(
+        {"embedding_provider": "ollama", "embedding_model": "mxbai-embed-large:latest"}
+    )
+    hashed = EmbeddingFactory.create_provider(
+        {"embedding_provider": "hash", "embedding_dimension": 64}
+    )
+
+    assert (openai.model_id, openai.dimension) == ("text-embedding-3-large", 3072)
+    assert isinstance(ollama, OllamaEmbeddings)
+    # Known models don't need a probe request for their dimension
+    assert (ollama.model_id, ollama.dimension) == (
+        "ollama/mxbai-embed-large:latest",
+        1024,
+    )
+    assert isinstance(hashed, HashEmbeddings)
+    assert (hashed.model_id, hashed.dimension) == ("hash-64", 64)
+
+
+def test_factory_rejects_unknown_providers_and_dimensions():
+    with pytest.raises(ValueError):
+        EmbeddingFactory.create_provider({"embedding_provider": "unknown"})
+    with pytest.raises(ValueError):
+        EmbeddingFactory.create_provider({"embedding_model": "custom-model"})
+
+    provider = EmbeddingFactory.create_provider(
+        {"embedding_model": "custom-model", "embedding_dimension": 512}
+    )
+    assert provider.dimension == 512
+
+
+class WordCountEmbeddings(HashEmbeddings):
+    def count_tokens(self, text):
+        return len(text.split())
+
+
+def test_batches_are_capped_by_count_and_tokens(monkeypatch):
+    provider = WordCountEmbeddings()
+    monkeypatch.setattr(embedding_service, "_embedding_provider", provider)
+    texts = [" ".join(["word"] * size) for size in (2, 3, 12, 1, 1, 1, 4, 5)]
+
+    batches = list(batch_texts(texts, batch_size=3, max_batch_tokens=10))
+
+    assert [text for batch in batches for text in batch] == texts
+    # Too large for any batch, so it's sent on its own
+    assert [texts[2]] in batches
+    for batch in batches:
+        assert len(batch) <= 3
+        tokens = sum(provider.count_tokens(text) for text in batch)
+        assert tokens <= 10 or len(batch) == 1
+    assert [len(batch) for batch in batches] == [2, 1, 3, 2]
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import uuid
+
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+from modules.conversations.services.conversation_service import ConversationService
+from modules.documents.parsing import split_text
+from modules.documents.services import document_service, ingestion_service
+from modules.documents.services.document_service import (
+    DocumentManager,
+    DocumentService,
+)
+from modules.documents.services.ingestion_service import (
+    IngestionQueue,
+    IngestionService,
+)
+from modules.documents.services.vector_store import VectorIndex
+
+
+def _text():
+    # Several chunks, unique to this test run (the test database is shared)
+    key = uuid.uuid4().hex
+    return "\n\n".join(f"{key} paragraph {i}. " * 40 for i in range(8))
+
+
+def _setup_queue(db_session, tmp_path, monkeypatch):
+    """
+    Run jobs against the test database & a temporary index, without embedding
+    requests or a websocket. Returns the embedded chunk hashes & sent statuses.
+    """
+    embedded_hashes = []
+    statuses = []
+
+    async def get_embeddings(self, chunks):
+        embedded_hashes.extend(chunks)
+        return {
+            chunk_hash_id: np.random.rand(8).astype(np.float32)
+            for chunk_hash_id in chunks
+        }
+
+    async def send_status(self, db, job):
+        statuses.append(job.serialize())
+
+    vector_index = VectorIndex(str(tmp_path / "index"), dimension=8)
+    monkeypatch.setattr(
+        document_service.EmbeddingCache, "get_embeddings", get_embeddings
+    )
+    monkeypatch.setattr(
+        ingestion_service, "SessionLocal", sessionmaker(bind=db_session.get_bind())
+    )
+    monkeypatch.setattr(
+        ingestion_service,
+        "DocumentManager",
+        lambda db, conversation_id: DocumentManager(
+            db, conversation_id, vector_index=vector_index
+        ),
+    )
+    monkeypatch.setattr(IngestionQueue, "send_status", send_status)
+    return embedded_hashes, statuses
+
+
+def _file_job(db_session, tmp_path, text):
+    conversation = ConversationService(db_session).create_conversation()
+    file_path = str(tmp_path / uuid.uuid4().hex)
+    with open(file_path, "w") as spool_file:
+        spool_file.write(text)
+
+    return IngestionService(db_session).create_job(
+        conversation_id=conversation.id,
+        source_type="file",
+        source="notes.txt",
+        content_type="text/plain",
+        file_path=file_path,
+    )
+
+
+def _run_unfinished_jobs():
+    async def run():
+        queue = IngestionQueue()
+        await queue.start()
+        await queue.queue.join()
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_pending_job_is_resumed_without_embedding_stored_chunks(
+    db_session, tmp_path, monkeypatch
+):
+    embedded_hashes, statuses = _setup_queue(db_session, tmp_path, monkeypatch)
+    text = _text()
+    chunks = split_text(text, 1500)
+    chunk_hashes = [chunk_hash_id for _, chunk_hash_id in chunks]
+    job = _file_job(db_session, tmp_path, text)
+    # The job was cut short by a restart after saving its first chunk
+    DocumentService(db_session).bulk_create_documents(
+        [
+            {
+                "id": chunk_hashes[0],
+                "type": "text",
+                "collection": None,
+                "title": None,
+                "content": chunks[0][0],
+                "source": "notes.txt",
+                "document_key": job.document_key,
+            }
+        ]
+    )
+    db_session.commit()
+    embedded_hashes.clear()
+
+    _run_unfinished_jobs()
+
+    db_session.refresh(job)
+    assert job.status == "completed"
+    assert job.chunks_embedded == len(chunk_hashes)
+    assert not os.path.exists(job.file_path)
+    assert sorted(embedded_hashes) == sorted(chunk_hashes[1:])
+    documents = DocumentService(db_session).get_documents_by_hashes(chunk_hashes)
+    assert len(documents) == len(chunk_hashes)
+    assert {doc.document_key for doc in documents} == {job.document_key}
+    assert statuses[-1]["status"] == "completed"
+
+
+def test_progress_events_count_up_to_every_chunk(db_session, tmp_path, monkeypatch):
+    _, statuses = _setup_queue(db_session, tmp_path, monkeypatch)
+    monkeypatch.setattr(
+        document_service, "settings", {"documents": {"ingest_batch_size": 2}}
+    )
+    text = _text()
+    chunk_count = len(split_text(text, 1500))
+    job = _file_job(db_session, tmp_path, text)
+
+    _run_unfinished_jobs()
+
+    statuses = [status for status in statuses if status["id"] == job.id]
+    assert [status["status"] for status in statuses[:1]] == ["running"]
+    assert statuses[-1]["status"] == "completed"
+    progress = [status["chunks_embedded"] for status in statuses]
+    assert progress == sorted(progress)
+    # Batches of 2, then the final count, which covers every chunk
+    assert progress[1:-1] == [*range(2, chunk_count + 1, 2), chunk_count]
+    assert statuses[-1]["chunks_embedded"] == chunk_count
+    assert statuses[-1]["pages_parsed"] == 1
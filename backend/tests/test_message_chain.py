@@ -0,0 +1,49 @@
+from modules.messages.schemas import FunctionMessage, UserMessage
+from modules.messages.services.message_chain import MessageChain
+
+
+def _texts(chain):
+    return [message.content.text for message in chain]
+
+
+def test_chain_order_with_history_added_newest_first():
+    context = MessageChain(
+        system_message="system",
+        user_message=UserMessage(content={"text": "question"}),
+    )
+    context.add_snippet("snippet")
+    for number in reversed(range(3)):
+        context.add_user_message({"text": f"history {number}"}, history=True)
+    context.function_message = FunctionMessage(
+        content={"text": "tool output"}, function_call={"name": "tool"}
+    )
+
+    assert _texts(context.compiled_chain()) == [
+        "system",
+        "snippet",
+        "history 0",
+        "history 1",
+        "history 2",
+        "tool output",
+        "question",
+    ]
+
+
+def test_compiled_chain_is_cached_until_the_chain_changes():
+    context = MessageChain(system_message="system")
+    compiled = context.compiled_chain()
+    assert context.compiled_chain() is compiled
+
+    context.add_user_message({"text": "older"}, history=True)
+    assert _texts(context.compiled_chain()) == ["system", "older"]
+
+    context.user_message = UserMessage(content={"text": "question"})
+    assert _texts(context.compiled_chain()) == ["system", "older", "question"]
+
+    context.add_snippet("snippet", index=1)
+    assert _texts(context.compiled_chain()) == [
+        "system",
+        "snippet",
+        "older",
+        "question",
+    ]
@@ -0,0 +1,102 @@
+import importlib.util
+import json
+import os
+
+import sqlalchemy as sa
+import tiktoken
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from modules.conversations.services.conversation_service import ConversationService
+from modules.messages.services import message_service
+from modules.messages.services.message_service import MessageService
+from modules.messages.services.token_counter import TOKENIZER
+
+MIGRATION_PATH = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "alembic",
+    "versions",
+    "a41d6e0c9b57_add_message_token_counts.py",
+)
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+def test_create_message_stores_token_count(db_session, monkeypatch):
+    counted_texts = []
+
+    def count_tokens(text):
+        counted_texts.append(text)
+        return len(text.split())
+
+    monkeypatch.setattr(message_service, "count_tokens", count_tokens)
+    conversation = ConversationService(db_session).create_conversation()
+    service = MessageService(db_session)
+
+    counted = service.create_message(
+        "user", {"text": "three words here"}, conversation.id
+    )
+    # Counted already for the context it was sent in
+    passed = service.create_message(
+        "user", {"text": "two words"}, conversation.id, tokens=7
+    )
+
+    db_session.expire_all()
+    assert (counted.token_count, counted.tokenizer) == (3, TOKENIZER)
+    assert (passed.token_count, passed.tokenizer) == (7, TOKENIZER)
+    assert counted_texts == ["three words here"]
+
+
+def _run_token_count_migration(rows):
+    spec = importlib.util.spec_from_file_location("migration", MIGRATION_PATH)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(
+            sa.text("CREATE TABLE message_model (id INTEGER PRIMARY KEY, content JSON)")
+        )
+        for id, content in rows:
+            connection.execute(
+                sa.text(
+                    "INSERT INTO message_model (id, content) VALUES (:id, :content)"
+                ),
+                {"id": id, "content": json.dumps(content)},
+            )
+
+        with Operations.context(MigrationContext.configure(connection)):
+            migration.upgrade()
+
+        return connection.execute(
+            sa.text("SELECT id, token_count, tokenizer FROM message_model ORDER BY id")
+        ).fetchall()
+
+
+def test_token_count_migration_backfills_messages(monkeypatch):
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: WordEncoding())
+
+    rows = _run_token_count_migration(
+        [(1, {"text": "a few words"}), (2, {"text": ""}), (3, {"files": []})]
+    )
+
+    assert [tuple(row) for row in rows] == [
+        (1, 3, TOKENIZER),
+        (2, 0, TOKENIZER),
+        (3, 0, TOKENIZER),
+    ]
+
+
+def test_token_count_migration_skips_backfill_without_tokenizer(monkeypatch):
+    def get_encoding(name):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", get_encoding)
+
+    rows = _run_token_count_migration([(1, {"text": "a few words"})])
+
+    # Left to be counted at read time
+    assert [tuple(row) for row in rows] == [(1, None, None)]
@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy as np
+from modules.conversations.services import recall_service
+from modules.conversations.services.conversation_service import ConversationService
+from modules.conversations.services.recall_service import RecallService
+from modules.documents.services.embedding_cache import EmbeddingCache
+from modules.documents.services import vector_store
+from modules.documents.services.vector_store import VectorIndex
+from modules.messages.models import MessageModel
+
+TOPICS = ["cats", "rain", "code", "tea"]
+
+
+def _embed(text):
+    # One dimension per topic mentioned in the text
+    return np.array(
+        [1.0 if topic in text else 0.0 for topic in TOPICS], dtype=np.float32
+    )
+
+
+def _recall_service(monkeypatch, tmp_path):
+    async def get_embeddings(self, chunks):
+        return {text_hash: _embed(text) for text_hash, text in chunks.items()}
+
+    monkeypatch.setattr(EmbeddingCache, "get_embeddings", get_embeddings)
+    monkeypatch.setattr(
+        recall_service,
+        "create_vector_index",
+        lambda name, index_settings: VectorIndex(
+            str(tmp_path / name), dimension=len(TOPICS)
+        ),
+    )
+    return RecallService
+
+
+def _add_messages(db_session, conversation, texts):
+    messages = []
+    for position, text in enumerate(texts):
+        message = MessageModel(
+            conversation_id=conversation.id,
+            role="user" if position % 2 == 0 else "assistant",
+            content={"text": text},
+        )
+        db_session.add(message)
+        messages.append(message)
+    db_session.commit()
+    return messages
+
+
+def test_recalled_turns_pair_messages_with_their_reply(
+    db_session, monkeypatch, tmp_path
+):
+    service = _recall_service(monkeypatch, tmp_path)(db_session)
+    service.results = 2
+    conversation = ConversationService(db_session).create_conversation()
+    messages = _add_messages(
+        db_session,
+        conversation,
+        ["tell me about cats", "cats sleep a lot", "will it rain", "rain later"],
+    )
+    asyncio.run(service.index_messages(conversation.id))
+
+    turns = asyncio.run(
+        service.find_relevant_turns(conversation, "more cats", messages[-1].id + 1)
+    )
+
+    # Both messages of the cats turn match, it's still recalled once
+    assert [[message.id for message in turn] for turn in turns] == [
+        [messages[0].id, messages[1].id],
+        [messages[2].id, messages[3].id],
+    ]
+
+
+def test_recall_leaves_out_messages_from_before_id(db_session, monkeypatch, tmp_path):
+    service = _recall_service(monkeypatch, tmp_path)(db_session)
+    conversation = ConversationService(db_session).create_conversation()
+    messages = _add_messages(
+        db_session, conversation, ["any code tips", "write tests for code"]
+    )
+    asyncio.run(service.index_messages(conversation.id))
+
+    turns = asyncio.run(
+        service.find_relevant_turns(conversation, "code", messages[1].id)
+    )
+
+    # The reply is newer than the cut-off, so the turn is just the question
+    assert [[message.id for message in turn] for turn in turns] == [[messages[0].id]]
+
+
+def test_deleted_conversation_index_is_removed(db_session, monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_store, "data_path", str(tmp_path))
+    monkeypatch.setattr(recall_service, "data_path", str(tmp_path))
+    service = _recall_service(monkeypatch, tmp_path)(db_session)
+    conversation = ConversationService(db_session).create_conversation()
+    _add_messages(db_session, conversation, ["tea please", "tea it is"])
+    asyncio.run(service.index_messages(conversation.id))
+
+    service.delete_index(conversation.id)
+
+    assert not (tmp_path / "messages" / str(conversation.id)).exists()
+    assert recall_service.message_indexes.get(conversation.id) is None
@@ -0,0 +1,108 @@
+import asyncio
+import uuid
+
+import numpy as np
+from modules.conversations.services.conversation_service import ConversationService
+from modules.documents.services import document_service
+from modules.documents.services.document_service import DocumentManager
+from modules.documents.services.search_cache import TTLCache, search_cache
+from modules.documents.services.vector_store import VectorIndex
+
+
+def _chunk(document_key):
+    chunk_hash_id = uuid.uuid4().hex
+    return {
+        "id": chunk_hash_id,
+        "type": "text/plain",
+        "collection": None,
+        "title": "notes.txt",
+        "content": f"content of {chunk_hash_id}",
+        "source": "notes.txt",
+        "document_key": document_key,
+    }
+
+
+def test_ttl_cache_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    cache = TTLCache(max_size=2, ttl=10)
+
+    cache.put("key", "value")
+    now[0] += 9
+    assert cache.get("key") == "value"
+
+    now[0] += 2
+    assert cache.get("key") is None
+    assert "key" not in cache.entries
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=10)
+
+    cache.put("first", 1)
+    cache.put("second", 2)
+    cache.get("first")
+    cache.put("third", 3)
+
+    assert cache.get("second") is None
+    assert (cache.get("first"), cache.get("third")) == (1, 3)
+
+
+def test_search_results_change_after_documents_change(
+    db_session, tmp_path, monkeypatch
+):
+    query_embeddings = []
+
+    async def get_query_embeddings(text):
+        query_embeddings.append(text)
+        return [0.0] * 8
+
+    async def get_chunk_embeddings(self, chunks):
+        return {
+            chunk_hash_id: np.random.rand(8).astype(np.float32)
+            for chunk_hash_id in chunks
+        }
+
+    monkeypatch.setattr(document_service, "get_embeddings", get_query_embeddings)
+    monkeypatch.setattr(
+        document_service.EmbeddingCache, "get_embeddings", get_chunk_embeddings
+    )
+    conversation_service = ConversationService(db_session)
+    conversation = conversation_service.create_conversation()
+    other_conversation = conversation_service.create_conversation()
+    vector_index = VectorIndex(str(tmp_path / "index"), dimension=8)
+    manager = DocumentManager(db_session, conversation.id, vector_index=vector_index)
+    first_key, second_key, other_key = (uuid.uuid4().hex for _ in range(3))
+    asyncio.run(manager.save_chunks([_chunk(first_key)], conversation.id))
+    asyncio.run(manager.save_chunks([_chunk(other_key)], other_conversation.id))
+
+    # Query embeddings are cached for the whole module, keep this one unique
+    query = f"what's in my notes? {uuid.uuid4().hex}"
+
+    def search():
+        results = asyncio.run(manager.similar_search(query))
+        return {result["document_key"] for result in results}
+
+    assert search() == {first_key}
+    assert search() == {first_key}
+    assert len(query_embeddings) == 1  # The second search was served cached
+
+    # Ingest
+    generation = search_cache.generation
+    asyncio.run(manager.save_chunks([_chunk(second_key)], conversation.id))
+    assert search_cache.generation > generation
+    assert search() == {first_key, second_key}
+
+    # Link, which doesn't touch the vector index
+    generation = search_cache.generation
+    index_generation = vector_index.generation
+    manager.add_conversation_id(other_key)
+    assert search_cache.generation > generation
+    assert vector_index.generation == index_generation
+    assert search() == {first_key, second_key, other_key}
+
+    # Delete
+    generation = search_cache.generation
+    manager.delete_documents(first_key)
+    assert search_cache.generation > generation
+    assert search() == {second_key, other_key}
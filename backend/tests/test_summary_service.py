@@ -0,0 +1,98 @@
+import asyncio
+
+from modules.conversations.services import summary_service
+from modules.conversations.services.conversation_service import ConversationService
+from modules.conversations.services.summary_service import SummaryService
+from modules.messages.models import MessageModel
+from modules.messages.services.token_counter import TOKENIZER
+
+
+def _count_words(text):
+    return len(text.split()) if text else 0
+
+
+def _conversation(db_session, texts, tokens=10):
+    conversation = ConversationService(db_session).create_conversation()
+    conversation.settings = {"llm": {}}
+    messages = []
+    for position, text in enumerate(texts):
+        message = MessageModel(
+            conversation_id=conversation.id,
+            role="user" if position % 2 == 0 else "assistant",
+            content={"text": text},
+            token_count=tokens,
+            tokenizer=TOKENIZER,
+        )
+        db_session.add(message)
+        messages.append(message)
+    db_session.commit()
+    return conversation, messages
+
+
+def test_cutoff_keeps_the_newest_messages_within_budget(db_session):
+    service = SummaryService(db_session)
+    conversation, messages = _conversation(db_session, ["one", "two", "three", "four"])
+
+    # 10 tokens each, newest first: 10, 20, then 30 doesn't fit
+    assert service.find_cutoff(conversation, 25) == messages[1].id
+    assert service.find_cutoff(conversation, 40) is None
+
+    conversation.summary_message_id = messages[1].id
+    assert service.find_cutoff(conversation, 15) == messages[2].id
+    conversation.summary_message_id = messages[2].id
+    assert service.find_cutoff(conversation, 15) is None
+
+
+def test_history_is_folded_in_chunks(db_session, monkeypatch):
+    prompts = []
+
+    class FakeLLM:
+        async def create_completion(self, context):
+            prompts.append(context.user_message.content.text)
+            return f"summary {len(prompts)}"
+
+    monkeypatch.setattr(summary_service, "count_tokens", _count_words)
+    monkeypatch.setattr(
+        summary_service.LLMFactory,
+        "create_llm",
+        staticmethod(lambda llm_settings, message_handler: FakeLLM()),
+    )
+    service = SummaryService(db_session)
+    # "USER: a b c" is 4 tokens, so two messages fit in a request
+    service.chunk_tokens = 8
+    conversation, messages = _conversation(
+        db_session, ["a b c", "d e f", "g h i", "j k l", "m n o"]
+    )
+
+    asyncio.run(service.summarize(conversation, messages[3].id))
+
+    assert len(prompts) == 2
+    assert "USER: a b c" in prompts[0] and "g h i" not in prompts[0]
+    # The second request builds on the first summary
+    assert "summary 1" in prompts[1] and "ASSISTANT: j k l" in prompts[1]
+    assert "m n o" not in prompts[1]
+    assert conversation.summary == "summary 2"
+    assert conversation.summary_message_id == messages[3].id
+    assert conversation.summary_token_count == _count_words(
+        service.format_summary("summary 2")
+    )
+
+
+def test_failed_completion_keeps_the_summary(db_session, monkeypatch):
+    class FailingLLM:
+        async def create_completion(self, context):
+            return None
+
+    monkeypatch.setattr(summary_service, "count_tokens", _count_words)
+    monkeypatch.setattr(
+        summary_service.LLMFactory,
+        "create_llm",
+        staticmethod(lambda llm_settings, message_handler: FailingLLM()),
+    )
+    service = SummaryService(db_session)
+    conversation, messages = _conversation(db_session, ["a b c", "d e f"])
+
+    asyncio.run(service.summarize(conversation, messages[1].id))
+
+    assert conversation.summary is None
+    assert conversation.summary_message_id is None
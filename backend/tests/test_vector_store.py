@@ -0,0 +1,319 @@
+import os
+
+import faiss
+import numpy as np
+import pytest
+from backend.modules.documents.services.vector_store import (
+    INDEX_CLASSES,
+    INDEX_FACTORY_STRINGS,
+    VectorIndex,
+)
+
+# Small enough to train quickly, merges only run when a test asks for one
+TEST_INDEX_SETTINGS = {"nlist": 4, "nprobe": 4, "pq_m": 4, "merge_max_segments": 100}
+
+
+def _random_vectors(count, dimension=8):
+    return np.random.rand(count, dimension).astype(np.float32)
+
+
+def _ids(start, count):
+    return np.arange(start, start + count, dtype=np.int64)
+
+
+def _index_settings(index_type, **index_settings):
+    return {**TEST_INDEX_SETTINGS, "index_type": index_type, **index_settings}
+
+
+def _built_index(path, index_type, **index_settings):
+    """
+    An index with a base of the given type, holding vectors under ids 0..n-1
+    """
+    index = VectorIndex(path, 8, _index_settings(index_type, **index_settings))
+    count = max(index.train_threshold, 200)
+    vectors = _random_vectors(count)
+    index.build(_ids(0, count), vectors)
+    assert isinstance(index.inner_index, INDEX_CLASSES[index_type])
+    return index, vectors
+
+
+def _assert_ids_match_vectors(index, vectors, ids, removed_ids=()):
+    # Approximate & quantized indexes may rank a close neighbour first, but a
+    # vector's own id must be among its nearest ones
+    distances, found_ids = index.search(vectors[ids], 10)
+    for row, id in enumerate(ids):
+        assert id in found_ids[row]
+    assert not set(found_ids.ravel().tolist()) & set(removed_ids)
+
+
+def test_vectors_are_keyed_by_id(tmp_path):
+    index = VectorIndex(str(tmp_path / "index"), dimension=8)
+    vectors = _random_vectors(3)
+
+    index.add(vectors, np.array([10, 20, 30], dtype=np.int64))
+    distances, ids = index.search(vectors[1:2], 1)
+
+    assert index.ntotal == 3
+    assert ids[0][0] == 20
+
+
+@pytest.mark.parametrize("index_type", INDEX_FACTORY_STRINGS)
+def test_remove_keeps_other_ids_and_persists(tmp_path, index_type):
+    path = str(tmp_path / "index")
+    index, vectors = _built_index(path, index_type)
+    removed_ids = list(range(1, 100))
+
+    index.remove(np.array(removed_ids, dtype=np.int64))
+
+    reloaded = VectorIndex(path, 8, _index_settings(index_type))
+    for loaded in (index, reloaded):
+        _assert_ids_match_vectors(loaded, vectors, [0, 100, 150], removed_ids)
+        assert loaded.ntotal == len(vectors) - 99
+
+
+def test_reloads_when_file_changes(tmp_path):
+    path = str(tmp_path / "index")
+    first = VectorIndex(path, dimension=8)
+    second = VectorIndex(path, dimension=8)
+
+    second.add(_random_vectors(4), _ids(0, 4))
+    distances, ids = first.search(_random_vectors(1), 2)
+
+    assert first.ntotal == 4
+    assert len(ids[0]) == 2
+
+
+def test_positional_index_is_migrated_to_ids(tmp_path):
+    path = str(tmp_path / "index")
+    legacy_index = faiss.IndexFlatL2(8)
+    vectors = _random_vectors(3)
+    legacy_index.add(vectors)
+    faiss.write_index(legacy_index, f"{path}.bin")
+
+    index = VectorIndex(path, dimension=8)
+    assert index.is_positional
+
+    index.assign_ids({0: 100, 2: 300})
+    distances, ids = index.search(vectors[2:3], 1)
+
+    assert not index.is_positional
+    assert index.ntotal == 2
+    assert ids[0][0] == 300
+
+
+def test_ivf_index_trains_once_enough_vectors(tmp_path):
+    index_settings = {"index_type": "IVFFlat", "nlist": 4, "nprobe": 4}
+    index = VectorIndex(str(tmp_path / "index"), 8, index_settings)
+
+    index.add(_random_vectors(100), _ids(0, 100))
+    assert isinstance(index.inner_index, faiss.IndexFlat)
+
+    vectors = _random_vectors(100)
+    index.add(vectors, _ids(100, 100))
+    index.merge_thread.join()
+    distances, ids = index.search(vectors[:1], 1)
+
+    assert isinstance(index.inner_index, faiss.IndexIVFFlat)
+    assert index.ntotal == 200
+    assert ids[0][0] == 100
+
+
+def test_filtered_search_returns_only_allowed_ids(tmp_path):
+    index_settings = {"index_type": "IVFFlat", "nlist": 4, "nprobe": 1}
+    index = VectorIndex(str(tmp_path / "index"), 8, index_settings)
+    index.add(_random_vectors(300), _ids(0, 300))
+    index.merge()
+
+    allowed_ids = np.array([3, 50, 120, 250, 299], dtype=np.int64)
+    distances, ids = index.search(_random_vectors(1), 10, allowed_ids)
+
+    assert sorted(ids[0]) == sorted(allowed_ids)
+
+
+@pytest.mark.parametrize("index_type", INDEX_FACTORY_STRINGS)
+def test_segments_are_appended_and_merged(tmp_path, index_type):
+    path = str(tmp_path / "index")
+    index, vectors = _built_index(path, index_type)
+    count = len(vectors)
+    vectors = np.concatenate([vectors, _random_vectors(6)])
+    removed_ids = list(range(1, 100)) + [count + 4]
+
+    index.add(vectors[count : count + 3], _ids(count, 3))
+    index.add(vectors[count + 3 :], _ids(count + 3, 3))
+    index.remove(np.array(removed_ids, dtype=np.int64))
+
+    reloaded = VectorIndex(path, 8, _index_settings(index_type))
+    assert len(reloaded.manifest["deltas"]) == 2
+    assert reloaded.ntotal == count - 94
+
+    index.merge()
+    reloaded.reload_if_changed()
+    assert reloaded.manifest["deltas"] == reloaded.manifest["tombstones"] == []
+    assert reloaded.index.ntotal == count - 94
+    assert len(os.listdir(path)) == 3  # base, manifest & lock file
+    surviving_ids = [0, 100, 150, count, count + 5]
+    _assert_ids_match_vectors(reloaded, vectors, surviving_ids, removed_ids)
+
+
+def test_merge_keeps_segments_committed_by_other_workers(tmp_path):
+    path = str(tmp_path / "index")
+    first = VectorIndex(path, 8, {"merge_max_segments": 100})
+    second = VectorIndex(path, 8, {"merge_max_segments": 100})
+    first.add(_random_vectors(5), _ids(1, 5))
+    late_vectors = _random_vectors(3)
+    swap_base = first._swap_base
+
+    def swap_after_other_writes(snapshot, index):
+        # Committed by another worker while the new base was being built
+        second.add(late_vectors, _ids(10, 3))
+        second.remove(np.array([2], dtype=np.int64))
+        return swap_base(snapshot, index)
+
+    first._swap_base = swap_after_other_writes
+    first.merge()
+
+    reloaded = VectorIndex(path, 8)
+    distances, ids = reloaded.search(late_vectors[:1], 1)
+    assert reloaded.ntotal == 7
+    assert ids[0][0] == 10
+    assert first.ntotal == 7
+    assert len(reloaded.manifest["deltas"]) == 1
+
+
+def test_ivf_merge_keeps_ids_mapped_to_their_vectors(tmp_path):
+    index_settings = {"index_type": "IVFFlat", "nlist": 4, "nprobe": 4}
+    index = VectorIndex(str(tmp_path / "index"), 8, index_settings)
+    vectors = _random_vectors(6000)
+    index.build(_ids(0, 6000), vectors)
+
+    index.remove(_ids(1, 99))
+    index.merge()
+
+    assert isinstance(index.inner_index, faiss.IndexIVFFlat)
+    assert index.ntotal == 5901
+    survivors = np.array([0, 100, 201, 3000, 5999], dtype=np.int64)
+    distances, ids = index.search(vectors[survivors], 1)
+    assert ids[:, 0].tolist() == survivors.tolist()
+    distances, ids = index.search(vectors[201:202], 1, before_id=300)
+    assert ids[0][0] == 201
+
+
+@pytest.mark.parametrize("index_type", INDEX_FACTORY_STRINGS)
+def test_mmap_base_is_rebuilt_on_merge(tmp_path, index_type):
+    path = str(tmp_path / "index")
+    index, vectors = _built_index(path, index_type, mmap=True)
+    count = len(vectors)
+    vectors = np.concatenate([vectors, _random_vectors(3)])
+    removed_ids = list(range(1, 100))
+
+    index.add(vectors[count:], _ids(count, 3))
+    index.remove(np.array(removed_ids, dtype=np.int64))
+    index.merge()
+
+    assert index.manifest["deltas"] == index.manifest["tombstones"] == []
+    assert index.ntotal == count - 96
+    _assert_ids_match_vectors(index, vectors, [0, 100, count + 2], removed_ids)
+
+
+def test_quantized_merge_rebuilds_from_vector_source(tmp_path):
+    vectors = _random_vectors(1000)
+    index = VectorIndex(
+        str(tmp_path / "index"),
+        dimension=8,
+        index_settings={"index_type": "SQ8", "mmap": True},
+        vector_source=lambda ids: {id: vectors[id] for id in ids.tolist()},
+    )
+    index.build(_ids(0, 1000), vectors)
+    index.remove(np.array([7], dtype=np.int64))
+
+    built = []
+    create_built_index = index._create_built_index
+
+    def spy(ids, vectors):
+        built.append((ids, vectors))
+        return create_built_index(ids, vectors)
+
+    index._create_built_index = spy
+    index.merge()
+
+    ids, rebuilt_vectors = built[0]
+    assert 7 not in ids
+    assert np.array_equal(rebuilt_vectors, vectors[ids])
+    assert index.ntotal == 999
+
+
+def test_quantized_index_supports_filtered_search(tmp_path):
+    index = VectorIndex(
+        str(tmp_path / "index"),
+        dimension=8,
+        index_settings={"index_type": "PQ", "pq_m": 4},
+    )
+    vectors = _random_vectors(10000)
+    index.build(_ids(0, 10000), vectors)
+
+    allowed_ids = np.array([3, 500, 9000], dtype=np.int64)
+    distances, ids = index.search(vectors[500:501], 5, allowed_ids=allowed_ids)
+
+    assert isinstance(index.inner_index, faiss.IndexPQ)
+    assert sorted(ids[0].tolist()) == [3, 500, 9000]
+
+
+def test_model_change_loads_empty_until_reset(tmp_path):
+    path = str(tmp_path / "index")
+    VectorIndex(path, dimension=8, model="a").add(_random_vectors(5), _ids(1, 5))
+
+    index = VectorIndex(path, dimension=16, model="b")
+    assert index.model_changed
+    assert index.ntotal == 0
+
+    index.reset()
+    index.add(_random_vectors(2, dimension=16), _ids(1, 2))
+
+    reloaded = VectorIndex(path, dimension=16, model="b")
+    assert not reloaded.model_changed
+    assert reloaded.ntotal == 2
+    assert reloaded.manifest["model"] == "b"
+
+
+def test_dimension_change_of_the_same_model_needs_a_rebuild(tmp_path):
+    path = str(tmp_path / "index")
+    VectorIndex(path, dimension=8, model="a").add(_random_vectors(5), _ids(1, 5))
+
+    assert not VectorIndex(path, dimension=8, model="a").model_changed
+    index = VectorIndex(path, dimension=16, model="a")
+    assert index.model_changed
+    assert index.ntotal == 0
+
+
+def test_compact_drops_dead_vectors_and_keeps_concurrent_writes(tmp_path):
+    path = str(tmp_path / "index")
+    index = VectorIndex(path, dimension=8)
+    index.add(_random_vectors(5), _ids(1, 5))
+    index.remove(np.array([1, 2], dtype=np.int64))
+    late_vector = _random_vectors(1)
+    create_built_index = index._create_built_index
+
+    def create_while_writing(ids, vectors):
+        # Written after the snapshot, must survive the swap
+        index.add(late_vector, _ids(10, 1))
+        return create_built_index(ids, vectors)
+
+    index._create_built_index = create_while_writing
+    assert index.compact(lambda ids, vectors: (ids[ids != 5], vectors[ids != 5])) == 3
+
+    reloaded = VectorIndex(path, dimension=8)
+    distances, ids = reloaded.search(late_vector, 1)
+    assert reloaded.ntotal == 3
+    assert ids[0][0] == 10
+    assert reloaded.manifest["tombstones"] == []
+
+
+def test_search_before_id_skips_newer_and_removed_ids(tmp_path):
+    index = VectorIndex(str(tmp_path / "index"), dimension=8)
+    vectors = _random_vectors(6)
+    index.add(vectors, _ids(1, 6))
+    index.remove(np.array([2], dtype=np.int64))
+
+    distances, ids = index.search(vectors[4:5], 6, before_id=5)
+
+    assert sorted(id for id in ids[0].tolist() if id != -1) == [1, 3, 4]
@@ -133,6 +133,23 @@ export default function useWebSocket() {
             store.notification = null;
             store.newNotification(message.content.tool_error, false, 'tool_error');
         }
+        else if (message.content.ingestion_job) {
+            handleIngestionJob(message.content.ingestion_job);
+        }
+    }
+
+    const handleIngestionJob = (job) => {
+        if (job.status == 'running') {
+            store.newNotification(`Adding ${job.source}: ${job.chunks_embedded} chunks embedded`, false, 'tool_start');
+        }
+        else if (job.status == 'completed') {
+            store.notification = null;
+            store.newNotification(`Document added: ${job.source}`, false, 'tool_success');
+        }
+        else if (job.status == 'failed') {
+            store.notification = null;
+            store.newNotification(`Couldn't add ${job.source}: ${job.error}`, true, 'tool_error');
+        }
     }
 
     const sendMessageThroughWebSocket = (message) => {